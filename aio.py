@@ -0,0 +1,211 @@
+import os
+import asyncio
+import datetime
+from sqlalchemy import select, func, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from . import get_url
+from .overview import Match, League, MatchOdds
+from .stats import PlayerMatchStats
+from .snapshots import TABLES, KEYS, metric_names
+
+
+# async driver used for each backend of the sync url; aiosqlite is only needed
+# for sqlite databases and asyncpg for postgres ones
+DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+_config = {'url': None, 'options': {}}
+_engine = {'engine': None, 'pid': None}
+# dispose tasks of replaced engines, referenced until they are done
+_disposing = set()
+
+SessionMaker = async_sessionmaker(expire_on_commit=False, autoflush=False)
+
+
+def async_url(url=None):
+    """
+    the package url (or url) with its driver swapped for the async one
+    """
+    url = make_url(url or get_url())
+    backend = url.get_backend_name()
+    if backend in DRIVERS:
+        url = url.set(drivername='%s+%s' % (backend, DRIVERS[backend]))
+    return url
+
+
+def configure(url=None, **options):
+    """
+    sets the url and create_async_engine options of the async engine, which
+    defaults to the package one. the current engine is disposed of: right away
+    outside an event loop, in a task of the running one otherwise (await
+    dispose() first to have it done by the time configure returns)
+    """
+    _config['url'] = url
+    _config['options'] = options
+    engine = _engine['engine']
+    _engine['engine'] = None
+    if engine is None or _engine['pid'] != os.getpid():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(engine.dispose())
+    else:
+        task = loop.create_task(engine.dispose())
+        _disposing.add(task)
+        task.add_done_callback(_disposing.discard)
+
+
+def get_engine():
+    """
+    the async engine, created on first use and again in every forked process
+    """
+    if _engine['engine'] is None or _engine['pid'] != os.getpid():
+        _engine['engine'] = create_async_engine(async_url(_config['url']),
+                                                **_config['options'])
+        _engine['pid'] = os.getpid()
+    return _engine['engine']
+
+
+async def dispose():
+    engine = _engine['engine']
+    _engine['engine'] = None
+    if engine is not None:
+        await engine.dispose()
+
+
+def async_session():
+    """
+    a new AsyncSession on the async engine, one per concurrent task
+    """
+    return SessionMaker(bind=get_engine())
+
+
+async def _execute(statement, session=None):
+    """
+    rows of statement, on session or on a connection of its own so that calls
+    can run concurrently
+    """
+    if session is not None:
+        return (await session.execute(statement)).all()
+    async with async_session() as s:
+        return (await s.execute(statement)).all()
+
+
+def _matches(kind, entity_id):
+    if kind == 'teams':
+        return select(Match).join(Match.league).where(or_(Match.home_id == entity_id,
+                                                          Match.away_id == entity_id))
+    return select(Match).join(Match.league).join(Match.players_stats).where(
+            PlayerMatchStats.player_id == entity_id)
+
+
+async def last_match(kind, entity_id, season, session=None):
+    """
+    last regular season match of the team or player in season
+    """
+    rows = await _execute(_matches(kind, entity_id).where(League.season == season).where(
+            Match.type == 'Season').order_by(Match.date.desc()).limit(1), session)
+    return rows[0][0] if rows else None
+
+
+async def prev_match(kind, entity_id, season, date, session=None):
+    """
+    match of the team or player in season immediately before date
+    """
+    rows = await _execute(_matches(kind, entity_id).where(League.season == season).where(
+            Match.date < date).order_by(Match.date.desc()).limit(1), session)
+    return rows[0][0] if rows else None
+
+
+async def rest_period(kind, entity_id, date=None, session=None):
+    """
+    time passed since the last match of the team or player before date, None if
+    there is none
+    """
+    if not date:
+        date = datetime.date.today()
+    match = _matches(kind, entity_id).where(Match.date < date).subquery()
+    rows = await _execute(select(func.max(match.c.date)), session)
+    return date - rows[0][0] if rows and rows[0][0] else None
+
+
+async def season_stats(kind, entity_id, season, date=None, metrics='critical', loc='all',
+                        type_=None, complete=False, session=None):
+    """
+    latest season snapshot of the team or player on or before date (the date of
+    their last regular season match if none), None where there is no snapshot or
+    no such match, as Player.season_stats
+    """
+    table = TABLES[kind][loc]
+    metrics = metric_names(metrics)
+    rows = []
+    if date is None:
+        match = await last_match(kind, entity_id, season, session)
+        date = match.date if match else None
+    if date is not None:
+        query = select(*[getattr(table, m) for m in metrics]).join(table.league).where(
+                getattr(table, KEYS[kind]) == entity_id).where(League.season == season
+                ).where(table.date <= date)
+        if kind == 'teams' and type_:
+            query = query.where(table.type == type_)
+        rows = await _execute(query.order_by(table.date.desc()).limit(1), session)
+    stats = [None if v is None else float(v) for v in rows[0]] if rows else \
+        [None] * len(metrics)
+    if complete:
+        stats = dict(zip(metrics, stats))
+    return stats
+
+
+async def odds(match_id, session=None):
+    rows = await _execute(select(MatchOdds).where(MatchOdds.match_id == match_id).order_by(
+            MatchOdds.id), session)
+    return [r[0] for r in rows]
+
+
+async def gather(*calls, limit=None):
+    """
+    awaits the lookups concurrently, at most limit at a time (the engine pool
+    bounds them otherwise), and returns their results in order
+    """
+    if limit is None:
+        return list(await asyncio.gather(*calls))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(call):
+        async with semaphore:
+            return await call
+
+    return list(await asyncio.gather(*[bounded(c) for c in calls]))
+
+
+async def matchup(home_id, away_id, season, date=None, metrics='critical', players=(),
+                    match_id=None, limit=None):
+    """
+    everything a prediction needs about a match, looked up concurrently: season
+    stats, rest and previous match of both teams, season stats of players and odds
+    """
+    date = date or datetime.date.today()
+    teams = [('home', home_id, 'home'), ('away', away_id, 'away')]
+    calls = []
+    for _, team_id, loc in teams:
+        calls += [season_stats('teams', team_id, season, date, metrics, complete=True),
+                  season_stats('teams', team_id, season, date, metrics, loc=loc,
+                               complete=True),
+                  rest_period('teams', team_id, date),
+                  prev_match('teams', team_id, season, date)]
+    calls += [season_stats('players', p, season, date, metrics, complete=True)
+              for p in players]
+    if match_id is not None:
+        calls.append(odds(match_id))
+    results = await gather(*calls, limit=limit)
+
+    rv = {}
+    for n, (side, team_id, loc) in enumerate(teams):
+        stats, at_loc, rest, prev = results[4 * n:4 * n + 4]
+        rv[side] = {'id': team_id, 'season_stats': stats, loc + '_stats': at_loc,
+                    'rest_period': rest, 'prev_match': prev}
+    rv['players'] = dict(zip(players, results[8:8 + len(players)]))
+    rv['odds'] = results[-1] if match_id is not None else None
+    return rv
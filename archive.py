@@ -0,0 +1,323 @@
+import os
+import json
+import numpy as np
+from sqlalchemy import Date, Integer, Numeric, String, select, func
+
+from . import Session
+from .fastload import as_float
+from .stats import PLAYER_STATS, TEAM_STATS, PlayerMatchStats, TeamMatchStats
+from .store import MatchLog
+from .snapshots import TABLES
+
+
+VERSION = 2
+MANIFEST = 'manifest.json'
+# every column file starts with a header of this fixed size, so appending only
+# rewrites the shape in place
+HEADER_SIZE = 256
+MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def _header(dtype, shape):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" \
+                % (np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+    header = header.ljust(HEADER_SIZE - len(MAGIC) - 2 - 1) + '\n'
+    return MAGIC + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+def _write(filename, values, rows=0):
+    """
+    appends values to the .npy column at filename, which holds rows rows. values
+    may be 2-d, rows of a fixed width
+    """
+    mode = 'r+b' if rows else 'wb'
+    width = int(np.prod(values.shape[1:]))
+    with open(filename, mode) as f:
+        f.seek(HEADER_SIZE + rows * width * values.dtype.itemsize)
+        f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(_header(values.dtype, (rows + len(values),) + values.shape[1:]))
+
+
+class Archive(object):
+    """
+    columnar copy of a table on disk: one .npy per column and a json manifest with
+    the schema, the row count and the watermark (last row id) of the data.
+    columns open memory mapped, so worker processes share one page cached copy.
+    strings are stored as int32 codes into the categories of the manifest.
+    a rewrite goes to a new generation of column files, so readers still
+    mapping the previous one are not disturbed
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest['version'] != VERSION:
+            raise ValueError('archive version %s, expected %s'
+                             % (self.manifest['version'], VERSION))
+
+    @property
+    def rows(self):
+        return self.manifest['rows']
+
+    @property
+    def watermark(self):
+        return self.manifest['watermark']
+
+    @property
+    def columns(self):
+        return [c['name'] for c in self.manifest['columns']]
+
+    def _filename(self, name, generation=None):
+        if generation is None:
+            generation = self.manifest['generation']
+        return os.path.join(self.path, '%s.%d.npy' % (name, generation) if generation
+                            else name + '.npy')
+
+    @classmethod
+    def create(cls, path, schema, meta=None):
+        """
+        empty archive at path with schema, a list of (column, dtype) where dtype
+        'category' holds strings, or (column, dtype, width) for 2-d columns
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        columns = []
+        for entry in schema:
+            name, dtype = entry[:2]
+            shape = [entry[2]] if len(entry) > 2 else []
+            stored = np.int32 if dtype == 'category' else np.dtype(dtype)
+            _write(os.path.join(path, name + '.npy'), np.empty([0] + shape, dtype=stored))
+            columns.append({'name': name, 'dtype': dtype if dtype == 'category' else
+                            np.lib.format.dtype_to_descr(stored), 'shape': shape,
+                            'categories': []})
+        manifest = {'version': VERSION, 'rows': 0, 'watermark': None, 'generation': 0,
+                    'columns': columns, 'meta': meta or {}}
+        with open(os.path.join(path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return cls(path)
+
+    def _encode(self, column, values):
+        if column['dtype'] == 'category':
+            codes = dict((c, n) for n, c in enumerate(column['categories']))
+            for v in set(values):
+                codes.setdefault(v, len(codes))
+            column['categories'] = sorted(codes, key=codes.get)
+            return np.array([codes[v] for v in values], dtype=np.int32)
+        return np.asarray(values).astype(np.dtype(column['dtype']), copy=False)
+
+    def _save(self):
+        tmp = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def append(self, data, watermark=None):
+        """
+        appends a dict of column arrays without rewriting what is stored. the
+        manifest is written last, so readers never see a half written append
+        """
+        count = len(data[self.columns[0]]) if data else 0
+        if not count:
+            return 0
+        for column in self.manifest['columns']:
+            _write(self._filename(column['name']), self._encode(column, data[column['name']]),
+                   self.rows)
+        self.manifest['rows'] += count
+        if watermark is not None:
+            self.manifest['watermark'] = int(watermark)
+        self._save()
+        return count
+
+    def rewrite(self, data, watermark=None):
+        """
+        replaces every row with data in a new generation of column files, switched
+        to by the manifest. the previous generation is kept for readers that
+        opened it, older ones are removed
+        """
+        generation = self.manifest['generation'] + 1
+        count = len(data[self.columns[0]]) if data else 0
+        for column in self.manifest['columns']:
+            column['categories'] = []
+            values = self._encode(column, data[column['name']]) if count else \
+                np.empty([0] + column['shape'], dtype=np.int32 if column['dtype'] ==
+                         'category' else np.dtype(column['dtype']))
+            _write(self._filename(column['name'], generation), values)
+        self.manifest.update({'rows': count, 'generation': generation,
+                              'watermark': None if watermark is None else int(watermark)})
+        self._save()
+        if generation > 1:
+            for name in self.columns:
+                try:
+                    os.remove(self._filename(name, generation - 2))
+                except OSError:
+                    pass
+        return count
+
+    def column(self, name, mmap_mode='r'):
+        """
+        the column as stored, memory mapped and cut to the rows of the manifest
+        """
+        values = np.load(self._filename(name), mmap_mode=mmap_mode)
+        return values[:self.rows]
+
+    def categories(self, name):
+        for column in self.manifest['columns']:
+            if column['name'] == name:
+                return np.array(column['categories'], dtype=object)
+
+    def load(self, mmap_mode='r'):
+        """
+        dict of every column, category columns decoded into strings
+        """
+        rv = {}
+        for column in self.manifest['columns']:
+            values = self.column(column['name'], mmap_mode)
+            if column['dtype'] == 'category':
+                values = self.categories(column['name'])[values]
+            rv[column['name']] = values
+        return rv
+
+
+def _dtype(column):
+    if isinstance(column.type, Date):
+        return 'datetime64[D]'
+    elif isinstance(column.type, String):
+        return 'category'
+    elif column.primary_key or column.foreign_keys:
+        return 'int64'
+    elif isinstance(column.type, (Integer, Numeric)):
+        return 'float64'
+    return 'category'
+
+
+def _open(path, schema, meta):
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return Archive(path)
+    return Archive.create(path, schema, meta)
+
+
+def _count(table, watermark, league_id):
+    statement = select(func.count()).select_from(table).where(table.c.id <= watermark)
+    if league_id is not None:
+        statement = statement.where(table.c.league_id == league_id)
+    return Session.execute(statement).scalar()
+
+
+def export_table(path, model, league_id=None):
+    """
+    writes the season snapshots of model (of league_id only if given) at path. rows
+    after the archive's watermark row id are appended; when rows at or below it
+    were deleted since, as a snapshot rebuild does, the archive is rewritten
+    """
+    table = model.__table__
+    schema = [(c.name, _dtype(c)) for c in table.columns]
+    archive = _open(path, schema, {'table': table.name, 'league_id': league_id})
+    if archive.manifest['meta'].get('league_id') != league_id:
+        raise ValueError('archive at %s holds league %s, not %s'
+                         % (path, archive.manifest['meta'].get('league_id'), league_id))
+    watermark = archive.watermark
+    if watermark is not None and _count(table, watermark, league_id) != archive.rows:
+        watermark = None
+    statement = select(*[as_float(c) if t == 'float64' else c
+                         for c, (_, t) in zip(table.columns, schema)])
+    if watermark is not None:
+        statement = statement.where(table.c.id > watermark)
+    if league_id is not None:
+        statement = statement.where(table.c.league_id == league_id)
+    rows = Session.execute(statement.order_by(table.c.id)).fetchall()
+    cols = list(zip(*rows))
+    data = dict((name, np.array([np.nan if v is None else v for v in cols[n]])
+                       if t == 'float64' else np.array(cols[n], dtype=object)
+                       if t == 'category' else np.array(cols[n]))
+                for n, (name, t) in enumerate(schema)) if rows else {}
+    if watermark is None and archive.rows:
+        return archive.rewrite(data, rows[-1][0] if rows else None)
+    return archive.append(data, rows[-1][0] if rows else None)
+
+
+def _log(kind):
+    if kind == 'players':
+        return MatchLog(PlayerMatchStats, 'player_id', PLAYER_STATS)
+    return MatchLog(TeamMatchStats, 'team_id', TEAM_STATS)
+
+
+def _log_data(log):
+    data = dict((name, getattr(log, name)) for name in log.fields)
+    data.update({'keys': log.keys, 'values': log.values})
+    return data
+
+
+def export_log(path, kind, compact=0.5):
+    """
+    writes the player or team match log at path, as a StatsStore holds it. each
+    export appends the box scores after the archive's watermark row id as a run
+    sorted by (entity, date), without rewriting the stored ones. once the runs
+    after the first hold more than compact times its rows, the archive is
+    rewritten as a single run (never if compact is None)
+    """
+    log = _log(kind)
+    schema = [('id', 'int64'), ('entity', 'int64'), ('match_id', 'int64'),
+              ('team_id', 'int64'), ('league_id', 'int64'), ('season', 'category'),
+              ('date', 'datetime64[D]'), ('type', 'category'), ('home', 'bool'),
+              ('opponent', 'int64'), ('keys', 'int64'),
+              ('values', 'float64', len(log.columns))]
+    archive = _open(path, schema, {'kind': kind, 'columns': log.columns, 'runs': [0]})
+    rows = log.query(archive.watermark or 0).all()
+    if not rows:
+        return 0
+    log.extend(rows)
+    runs = archive.manifest['meta']['runs']
+    if archive.rows:
+        runs.append(archive.rows)
+    archive.append(_log_data(log), log.watermark)
+    if compact is not None and len(runs) > 1 and archive.rows - runs[1] > compact * runs[1]:
+        compact_log(path, kind)
+    return len(rows)
+
+
+def compact_log(path, kind):
+    """
+    rewrites the match log archive at path as a single sorted run
+    """
+    log = load_log(path, kind)
+    archive = Archive(path)
+    archive.manifest['meta']['runs'] = [0]
+    return archive.rewrite(_log_data(log), log.watermark)
+
+
+def load_log(path, kind):
+    """
+    match log of an archive written by export_log, ready to back a StatsStore. the
+    columns of the first run are memory mapped as stored, only season and type
+    decoded; later runs are merged into them in memory
+    """
+    archive = Archive(path)
+    data = archive.load()
+    runs = archive.manifest['meta']['runs'] + [archive.rows]
+    log = _log(kind)
+    for name in log.fields:
+        setattr(log, name, data[name][:runs[1]])
+    log.values = data['values'][:runs[1]]
+    log.reindex(data['keys'][:runs[1]])
+    if runs[1] < archive.rows:
+        log.merge(dict((name, data[name][runs[1]:]) for name in log.fields),
+                  data['values'][runs[1]:])
+    return log
+
+
+def export(path, league_id=None):
+    """
+    match logs and snapshot tables of every kind under path, the snapshots of
+    league_id (if given) in archives of their own
+    """
+    rv = {}
+    for kind in ('players', 'teams'):
+        rv[kind] = export_log(os.path.join(path, kind), kind)
+        for loc, model in TABLES[kind].items():
+            name = model.__tablename__ if league_id is None else \
+                '%s.league_%d' % (model.__tablename__, league_id)
+            rv[name] = export_table(os.path.join(path, name), model, league_id)
+    return rv
@@ -0,0 +1,190 @@
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from sqlalchemy import event
+
+from . import Session
+from .overview import Match, League
+from .personnel import Player
+from .stats import TeamMatchStats, PlayerMatchStats
+from . import fastload, snapshots, store, synthetic
+
+
+SIZES = (
+    ('small', dict(leagues=1, teams=8, players=10, seasons=1)),
+    ('medium', dict(leagues=2, teams=12, players=12, seasons=2)),
+    ('large', dict(leagues=2, teams=20, players=13, seasons=3)),
+)
+
+
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        Session.expunge_all()
+        start = time.perf_counter()
+        rv = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), rv
+
+
+def orm_load(model, columns):
+    rows = Session.query(model).all()
+    return np.array([[np.nan if getattr(r, c) is None else float(getattr(r, c))
+                      for c in columns] for r in rows]).reshape(len(rows), len(columns))
+
+
+def loading(models=(TeamMatchStats, PlayerMatchStats), repeat=3):
+    """
+    seconds to load every row of models as float matrices through the ORM and
+    through fastload
+    """
+    report = []
+    for model in models:
+        columns = fastload.stat_columns(model)
+        orm, expected = _timed(lambda: orm_load(model, columns), repeat)
+        fast, (ids, values) = _timed(lambda: fastload.load(model, columns), repeat)
+        assert values.shape == expected.shape
+        report.append({'model': model.__name__, 'rows': len(ids), 'orm': orm, 'fast': fast,
+                       'speedup': orm / fast if fast else None})
+    return report
+
+
+def print_report(report):
+    for row in report:
+        print('%-8s ' % row.get('size', '') + '%(model)-20s %(rows)8d rows  orm %(orm)8.3fs  '
+              'fast %(fast)8.3fs  x%(speedup).1f' % row)
+
+
+class QueryCounter(object):
+    """
+    counts the statements executed on engine
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._executed)
+
+    def _executed(self, *args):
+        self.count += 1
+
+
+def percentiles(times, points=(50, 90, 99)):
+    """
+    latency percentiles and max, in milliseconds
+    """
+    times = np.array(times) * 1000
+    rv = dict(('p%d' % p, float(np.percentile(times, p))) for p in points)
+    rv['max'] = float(times.max())
+    return rv
+
+
+def _measure(counter, calls):
+    times = []
+    queries = counter.count
+    for fn in calls:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    rv = percentiles(times)
+    rv.update({'calls': len(times), 'queries': float(counter.count - queries) / len(times)})
+    return rv
+
+
+def _samples(calls, rng):
+    """
+    (player, season, date) of random box scores
+    """
+    rows = Session.query(PlayerMatchStats.player_id, League.season, Match.date
+            ).join(PlayerMatchStats.match).join(Match.league).all()
+    picks = [rows[n] for n in rng.randint(0, len(rows), calls)]
+    players = dict((p.id, p) for p in Session.query(Player).filter(
+                   Player.id.in_(set(r[0] for r in picks))))
+    return [(players[r[0]], r[1], r[2]) for r in picks]
+
+
+def lookups(samples):
+    """
+    the Player lookups under test, each a list of calls over samples
+    """
+    return [
+        ('season_stats', [lambda p=p, s=s, d=d: p.season_stats(s, d) for p, s, d in samples]),
+        ('last_match', [lambda p=p, s=s: p.last_match(s) for p, s, d in samples]),
+        ('prev_match', [lambda p=p, s=s, d=d: p.prev_match(s, d) for p, s, d in samples]),
+        ('rest_period', [lambda p=p, d=d: p.rest_period(d) for p, s, d in samples]),
+        ('mins_played', [lambda p=p, d=d: p.mins_played(d) for p, s, d in samples]),
+    ]
+
+
+def suite(sizes=SIZES, calls=100, seed=0, loads=None):
+    """
+    generates a synthetic database in memory at every size and times the
+    snapshot rebuild and the Player lookups, straight on the database and from
+    an in-memory store. one result row per (size, mode, case). the loading
+    report of every size is added to loads if given, as the database only
+    lives for its size
+    """
+    report = []
+    for name, size in sizes:
+        engine = synthetic.use_sqlite()
+        counter = QueryCounter(engine)
+        start = time.perf_counter()
+        created = synthetic.generate(seed=seed, **size)
+        info = {'size': name, 'matches': len(created['matches']),
+                'generate': time.perf_counter() - start}
+
+        def row(mode, case, result):
+            result.update(info, mode=mode, case=case)
+            report.append(result)
+
+        store.use_store(None)
+        row('db', 'rebuild', _measure(counter, [
+            lambda l=l: snapshots.rebuild(l) for l in created['leagues']]))
+        Session.commit()
+        samples = _samples(calls, np.random.RandomState(seed))
+        for case, fns in lookups(samples):
+            row('db', case, _measure(counter, fns))
+        row('store', 'load', _measure(counter, [store.load]))
+        for case, fns in lookups(samples):
+            row('store', case, _measure(counter, fns))
+        if loads is not None:
+            loads.extend(dict(r, size=name) for r in loading())
+        store.use_store(None)
+        Session.remove()
+        engine.dispose()
+    return report
+
+
+def print_suite(report):
+    print('%-8s %7s %-6s %-13s %6s %9s %9s %9s %9s %8s' % ('size', 'matches', 'mode', 'case',
+          'calls', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'queries'))
+    for r in report:
+        print('%(size)-8s %(matches)7d %(mode)-6s %(case)-13s %(calls)6d %(p50)9.2f '
+              '%(p90)9.2f %(p99)9.2f %(max)9.2f %(queries)8.1f' % r)
+
+
+def import_time(modules=('', 'overview', 'personnel', 'stats', 'store', 'snapshots'),
+                repeat=3):
+    """
+    best wall time in seconds of importing each module of the package in a fresh
+    interpreter, '' being the package itself
+    """
+    package = __package__ or __name__.rpartition('.')[0]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = 'import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)'
+    report = []
+    for module in modules:
+        name = '.'.join(n for n in (package, module) if n)
+        times = [float(subprocess.check_output([sys.executable, '-c', script % name],
+                                               cwd=root)) for _ in range(repeat)]
+        report.append((name, min(times)))
+    return report
+
+
+if __name__ == '__main__':
+    for name, seconds in import_time():
+        print('%-30s %8.1f ms' % (name, seconds * 1000))
+    loads = []
+    print_suite(suite(loads=loads))
+    print_report(loads)
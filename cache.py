@@ -0,0 +1,190 @@
+import copy
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    bounded results of stat lookups, least recently used evicted first and
+    entries older than ttl seconds dropped on access. every entry is tagged
+    with the (kind, entity_id, season) it depends on, entity_id None for
+    lookups over every team or player of the season
+    """
+
+    def __init__(self, maxsize=4096, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, key):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def get(self, key):
+        """
+        (True, value) of a live entry, (False, None) otherwise
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self.clock():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(entry[1])
+
+    def put(self, key, value, tags):
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            self.entries[key] = (expires, copy.deepcopy(value), tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def lookup(self, key, tags, compute):
+        """
+        the cached result of key, or that of compute() stored under tags
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value, tags)
+        return value
+
+    def invalidate(self, kind, entity_id, season):
+        """
+        drops the entries depending on the entity in season, along with those
+        over every entity of kind in season
+        """
+        with self.lock:
+            count = 0
+            for tag in set([(kind, entity_id, season), (kind, None, season)]):
+                for key in list(self.tags.get(tag, ())):
+                    self._drop(key)
+                    count += 1
+            self.invalidations += count
+            return count
+
+    def invalidate_season(self, season):
+        with self.lock:
+            count = 0
+            for tag in [t for t in self.tags if t[2] == season]:
+                for key in list(self.tags.get(tag, ())):
+                    self._drop(key)
+                    count += 1
+            self.invalidations += count
+            return count
+
+    def ingested(self, records):
+        for kind, entity_id, season in set((r.kind, r.entity_id, r.season) for r in records):
+            self.invalidate(kind, entity_id, season)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else None,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'invalidations': self.invalidations}
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_hashable(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    elif hasattr(value, 'tolist'):
+        return _hashable(value.tolist())
+    return value
+
+
+def cached(kind, entity='self'):
+    """
+    decorates a model lookup taking a season so that its results go through
+    the active cache. entity names where the looked up ids are: 'self' for the
+    instance, the name of an argument holding many ids, or None for lookups
+    over every entity of kind in the season
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = _cache
+            if cache is None:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            season = arguments['season']
+            if entity == 'self':
+                entities = [arguments['self'].id]
+            elif entity is None:
+                entities = [None]
+            else:
+                entities = list(arguments[entity])
+            key = (fn.__qualname__, tuple(entities) if entity == 'self' else None) + \
+                tuple(_hashable(v) for name, v in arguments.items()
+                      if name not in ('self', 'cls'))
+            return cache.lookup(key, [(kind, e, season) for e in entities],
+                                lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorate
+
+
+_cache = None
+
+
+def use_cache(cache):
+    """
+    makes cached lookups go through cache, None turns caching off
+    """
+    from . import signals
+    global _cache
+    if _cache is not None:
+        signals.unsubscribe(_cache.ingested)
+    _cache = cache
+    if cache is not None:
+        signals.subscribe(cache.ingested)
+
+
+def get_cache():
+    return _cache
+
+
+def enable(maxsize=4096, ttl=None):
+    """
+    creates a cache and makes it the active one
+    """
+    cache = LRUCache(maxsize, ttl)
+    use_cache(cache)
+    return cache
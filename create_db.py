@@ -2,20 +2,17 @@
 Setting up a pg database that contains this schema
     1. Create a new database in postgres called football
     2. Create a new user called bidder with password bidder
-    3. Run create_db
+    3. Run create_db as a module of the package (python -m <package>.create_db),
+       with BASKETBALL_DB_URL set if the database lives elsewhere
+    4. On a database created before the natural keys were declared, add their
+       unique indexes with upsert.ensure_unique, which upserts need
 """
 
-from sqlalchemy import create_engine
-import enums
-import overview
-import personnel
-import stats
-import events
-import Base, db_url
+from . import Base, get_engine
+from . import enums, overview, personnel, stats, events
 
 def create_db():
-    Engine = create_engine(db_url, echo=False)
-    Base.metadata.create_all(Engine)
+    Base.metadata.create_all(get_engine())
 
 
 if __name__ == '__main__':
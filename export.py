@@ -0,0 +1,124 @@
+import csv
+import numpy as np
+from sqlalchemy import select
+
+from . import Session
+from .archive import Archive
+from .fastload import as_float, stat_columns
+from .overview import Match, League
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+BOX_SCORES = {'teams': TeamMatchStats, 'players': PlayerMatchStats}
+MATCH_COLUMNS = [('date', 'datetime64[D]'), ('league_id', 'int64'), ('season', 'category'),
+                 ('type', 'category'), ('home_id', 'int64'), ('away_id', 'int64'),
+                 ('result', 'category')]
+
+
+def schema(kind, columns=None):
+    """
+    (name, dtype) of every exported column: keys, match and stats
+    """
+    model = BOX_SCORES[kind]
+    keys = ['id', 'player_id', 'match_id', 'team_id'] if kind == 'players' \
+        else ['id', 'match_id', 'team_id']
+    return [(k, 'int64') for k in keys] + MATCH_COLUMNS + \
+           [(c, 'float64') for c in (columns or stat_columns(model))]
+
+
+def statement(kind, league_id=None, season=None, type_=None, start=None, end=None,
+                columns=None):
+    """
+    box scores joined to their match and league, filtered and ordered by date
+    """
+    model = BOX_SCORES[kind]
+    table = model.__table__
+    fields = []
+    for name, dtype in schema(kind, columns):
+        if name == 'season':
+            fields.append(League.season)
+        elif name in dict(MATCH_COLUMNS):
+            fields.append(getattr(Match, name))
+        elif dtype == 'float64':
+            fields.append(as_float(table.c[name]).label(name))
+        else:
+            fields.append(table.c[name])
+    query = select(*fields).select_from(table.join(Match.__table__,
+                table.c.match_id == Match.id).join(League.__table__,
+                Match.league_id == League.id))
+    if league_id is not None:
+        query = query.where(Match.league_id == league_id)
+    if season is not None:
+        query = query.where(League.season == season)
+    if type_ is not None:
+        query = query.where(Match.type == type_)
+    if start is not None:
+        query = query.where(Match.date >= start)
+    if end is not None:
+        query = query.where(Match.date <= end)
+    return query.order_by(Match.date, table.c.id)
+
+
+def rows(kind, chunk_size=10000, **filters):
+    """
+    generator of lists of at most chunk_size rows, fetched through a server side
+    cursor so memory stays flat whatever the size of the export
+    """
+    connection = Session.connection().execution_options(stream_results=True)
+    result = connection.execute(statement(kind, **filters))
+    try:
+        while True:
+            chunk = result.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        result.close()
+
+
+def arrays(kind, chunk_size=10000, columns=None, **filters):
+    """
+    generator of chunks as dicts of numpy columns
+    """
+    fields = schema(kind, columns)
+    for chunk in rows(kind, chunk_size, columns=columns, **filters):
+        cols = list(zip(*chunk))
+        data = {}
+        for n, (name, dtype) in enumerate(fields):
+            if dtype == 'float64':
+                data[name] = np.array([np.nan if v is None else v for v in cols[n]])
+            elif dtype == 'category':
+                data[name] = np.array(cols[n], dtype=object)
+            else:
+                data[name] = np.array(cols[n], dtype=dtype)
+        yield data
+
+
+def to_csv(f, kind, chunk_size=10000, columns=None, **filters):
+    """
+    writes the box scores to a path or open file as csv, one chunk at a time,
+    and returns the rows written
+    """
+    if isinstance(f, str):
+        with open(f, 'w', newline='') as out:
+            return to_csv(out, kind, chunk_size, columns, **filters)
+    writer = csv.writer(f)
+    writer.writerow([name for name, _ in schema(kind, columns)])
+    count = 0
+    for chunk in rows(kind, chunk_size, columns=columns, **filters):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def to_numpy(path, kind, chunk_size=10000, columns=None, **filters):
+    """
+    writes the box scores as an archive of .npy columns at path, appending each
+    chunk as it arrives, and returns the rows written
+    """
+    archive = Archive.create(path, schema(kind, columns), {'kind': kind, 'filters':
+                             dict((k, str(v)) for k, v in filters.items())})
+    count = 0
+    for data in arrays(kind, chunk_size, columns, **filters):
+        count += archive.append(data, max(archive.watermark or 0, data['id'].max()))
+    return count
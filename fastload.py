@@ -0,0 +1,60 @@
+import numpy as np
+from sqlalchemy import Float, Integer, Numeric, cast, func, select
+
+from . import Session
+
+
+def stat_columns(model):
+    """
+    names of the numeric stat columns of model, keys and foreign keys excluded
+    """
+    return [c.name for c in model.__table__.columns
+            if isinstance(c.type, (Integer, Numeric)) and not c.primary_key
+            and not c.foreign_keys]
+
+
+def as_float(column):
+    """
+    casts column in SQL so the driver hands back floats instead of Decimals
+    """
+    return cast(column, Float)
+
+
+def fetch(statement, width, count=None, chunk_size=10000):
+    """
+    executes a Core statement whose columns are all numbers and copies the raw rows
+    chunk by chunk into a preallocated (rows, width) float64 array. null is nan
+    """
+    connection = Session.connection()
+    if count is None:
+        count = connection.execute(select(func.count()).select_from(
+                    statement.subquery())).scalar()
+    out = np.empty((count, width))
+    result = connection.execution_options(stream_results=True).execute(statement)
+    pos = 0
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        # plain tuples convert several times faster than result rows
+        block = np.array([tuple(r) for r in rows], dtype=float).reshape(len(rows), width)
+        if pos + len(block) > len(out):
+            out = np.resize(out, (pos + len(block), width))
+        out[pos:pos + len(block)] = block
+        pos += len(block)
+    return out[:pos]
+
+
+def load(model, columns=None, where=None, chunk_size=10000):
+    """
+    ids and a (rows, columns) float64 matrix of the stat columns of TeamMatchStats,
+    PlayerMatchStats or any of the season stats classes, without building ORM
+    instances or Decimals
+    """
+    table = model.__table__
+    columns = list(columns or stat_columns(model))
+    statement = select(table.c.id, *[as_float(table.c[c]) for c in columns])
+    if where is not None:
+        statement = statement.where(where)
+    values = fetch(statement.order_by(table.c.id), len(columns) + 1, chunk_size=chunk_size)
+    return values[:, 0].astype(np.int64), values[:, 1:]
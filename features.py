@@ -0,0 +1,156 @@
+import numpy as np
+from sqlalchemy import func
+
+from . import Session, parallel
+from .fastload import as_float
+from .overview import Match, League, MatchOdds
+from .snapshots import TABLES, metric_names
+from .streaks import parse_results
+from .travel import Distances, Travel, schedule
+
+
+ODDS = ['home_odds', 'away_odds', 'draw_odds', 'home_spread']
+
+
+def as_of(entity, group, day, values, q_entity, q_group, q_day):
+    """
+    rows of values of the latest (entity, group) snapshot strictly before each
+    query day, nan where there is none. snapshots need not be sorted
+    """
+    pairs = np.asarray(entity, dtype=np.int64) * (1 << 31) + np.asarray(group, dtype=np.int64)
+    q_pairs = np.asarray(q_entity, dtype=np.int64) * (1 << 31) + \
+        np.asarray(q_group, dtype=np.int64)
+    distinct = np.unique(pairs)
+    rv = np.full((len(q_day), np.shape(values)[1]), np.nan)
+    if not len(distinct):
+        return rv
+    keys = np.searchsorted(distinct, pairs) * (1 << 32) + np.asarray(day, dtype=np.int64)
+    order = np.argsort(keys, kind='mergesort')
+    keys, values = keys[order], np.asarray(values, dtype=float)[order]
+
+    code = np.minimum(np.searchsorted(distinct, q_pairs), len(distinct) - 1)
+    pos = np.searchsorted(keys, code * (1 << 32) + np.asarray(q_day, dtype=np.int64),
+                          side='left') - 1
+    found = (distinct[code] == q_pairs) & (pos >= 0)
+    found[found] &= (keys[pos[found]] >> 32) == code[found]
+    rv[found] = values[pos[found]]
+    return rv
+
+
+class FeatureMatrix(object):
+    """
+    one row of features per match, known before the match was played, and the
+    outcome parsed from its result
+    """
+
+    def __init__(self, match_id, X, y, columns):
+        self.match_id = match_id
+        self.X = X
+        self.y = y
+        self.columns = list(columns)
+
+    def __len__(self):
+        return len(self.match_id)
+
+    @classmethod
+    def concatenate(cls, parts, columns):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, len(columns))),
+                       np.empty(0, dtype=int), columns)
+        return cls(np.concatenate([p.match_id for p in parts]),
+                   np.vstack([p.X for p in parts]), np.concatenate([p.y for p in parts]),
+                   columns)
+
+    def column(self, name):
+        return self.X[:, self.columns.index(name)]
+
+
+def columns(metrics='critical'):
+    metrics = metric_names(metrics)
+    rv = []
+    for side in ('home', 'away'):
+        rv += ['%s_all_%s' % (side, m) for m in metrics]
+        rv += ['%s_%s_%s' % (side, side, m) for m in metrics]
+        rv += ['%s_%s' % (side, c) for c in ('REST', 'DIST_7', 'MATCHES_PLAYED_7')]
+    return rv + ODDS
+
+
+def _snapshots(loc, league_id, metrics, type_):
+    table = TABLES['teams'][loc]
+    rows = Session.query(table.team_id, table.league_id, table.date,
+                *[as_float(getattr(table, m)) for m in metrics]
+            ).filter(table.league_id == league_id).filter(table.type == type_).all()
+    cols = list(zip(*rows)) or [[]] * (3 + len(metrics))
+    values = np.array([[np.nan if v is None else v for v in r[3:]] for r in rows],
+                      dtype=float).reshape(len(rows), len(metrics))
+    return (np.array(cols[0], dtype=np.int64), np.array(cols[1], dtype=np.int64),
+            np.array(cols[2], dtype='datetime64[D]').astype(np.int64), values)
+
+
+def league(task):
+    """
+    feature matrix of the matches of one league (a season), from a handful of
+    queries: the matches with their odds, three snapshot tables, the schedule and
+    the distances
+    """
+    league_id, match_ids, metrics, type_ = task
+    query = Session.query(Match.id, Match.date, Match.home_id, Match.away_id, Match.result,
+                *[as_float(getattr(MatchOdds, c)) for c in ODDS]
+            ).outerjoin(Match.odds).filter(Match.league_id == league_id)
+    if match_ids is not None:
+        query = query.filter(Match.id.in_(match_ids))
+    rows = query.order_by(Match.date, Match.id).all()
+    # a match with several odds rows keeps the first
+    seen, unique = set(), []
+    for r in rows:
+        if r[0] not in seen:
+            seen.add(r[0])
+            unique.append(r)
+    rows = unique
+    cols = list(zip(*rows)) or [[]] * (5 + len(ODDS))
+    match_id = np.array(cols[0], dtype=np.int64)
+    day = np.array(cols[1], dtype='datetime64[D]').astype(np.int64)
+    home, away = np.array(cols[2], dtype=np.int64), np.array(cols[3], dtype=np.int64)
+    group = np.full(len(rows), league_id, dtype=np.int64)
+
+    features = []
+    snapshots = dict((loc, _snapshots(loc, league_id, metrics, type_))
+                     for loc in ('all', 'home', 'away'))
+    team, scheduled, days, cities = schedule(league_id)
+    rest = np.r_[np.nan, np.diff(days).astype(float)]
+    rest[np.r_[True, team[1:] != team[:-1]]] = np.nan
+    travel = Travel(team, scheduled, days, cities, Distances.load()).table()
+    rests = dict(zip(zip(team.tolist(), scheduled.tolist()), rest.tolist()))
+    for side, ids in (('home', home), ('away', away)):
+        for loc in ('all', side):
+            features.append(as_of(*snapshots[loc], q_entity=ids, q_group=group, q_day=day))
+        pairs = list(zip(ids.tolist(), match_id.tolist()))
+        features.append(np.array([[rests.get(p, np.nan)] + list(travel.get(p, (np.nan,) * 2))
+                                  for p in pairs], dtype=float).reshape(len(pairs), 3))
+    features.append(np.array([[np.nan if v is None else v for v in r[5:]] for r in rows],
+                             dtype=float).reshape(len(rows), len(ODDS)))
+    return FeatureMatrix(match_id, np.hstack(features), parse_results(cols[4]),
+                         columns(metrics))
+
+
+def build(match_ids=None, league_id=None, season=None, metrics='critical', type_='Season',
+            processes=None):
+    """
+    leakage free feature matrix of matches: home and away team snapshots (overall
+    and at home or away) of type_ from before the match day, rest days, travel and
+    odds, with outcomes (1 home win, 0 draw, -1 away win) as labels. matches are
+    given by id or by league or season; leagues are built in parallel
+    """
+    metrics = metric_names(metrics)
+    query = Session.query(Match.league_id, func.count(Match.id)).join(Match.league)
+    if match_ids is not None:
+        match_ids = list(match_ids)
+        query = query.filter(Match.id.in_(match_ids))
+    if league_id is not None:
+        query = query.filter(Match.league_id == league_id)
+    if season is not None:
+        query = query.filter(League.season == season)
+    leagues = [r[0] for r in query.group_by(Match.league_id).order_by(Match.league_id)]
+    tasks = [(l, match_ids, metrics, type_) for l in leagues]
+    return FeatureMatrix.concatenate(parallel.map(league, tasks, processes), columns(metrics))
@@ -0,0 +1,87 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import Session
+from .overview import Match, League, Team
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+def _options(box_scores=True, players=False):
+    """
+    loader options bringing league, teams, score, odds and box scores of
+    matches in a fixed number of queries, whatever the number of matches
+    """
+    options = [joinedload(Match.league).joinedload(League.country),
+               joinedload(Match.home).joinedload(Team.country),
+               joinedload(Match.away).joinedload(Team.country),
+               selectinload(Match.score), selectinload(Match.odds)]
+    if box_scores:
+        options.append(selectinload(Match.teams_stats))
+    if players:
+        options.append(selectinload(Match.players_stats).joinedload(PlayerMatchStats.player))
+    return options
+
+
+def _filter(query, league_id=None, start=None, end=None, season=None, type_=None):
+    if league_id is not None:
+        query = query.filter(Match.league_id == league_id)
+    if season is not None:
+        query = query.join(Match.league).filter(League.season == season)
+    if start is not None:
+        query = query.filter(Match.date >= start)
+    if end is not None:
+        query = query.filter(Match.date <= end)
+    if type_ is not None:
+        query = query.filter(Match.type == type_)
+    return query
+
+
+def matches(league_id=None, start=None, end=None, season=None, type_=None,
+                box_scores=True, players=False):
+    """
+    matches of league between start and end (inclusive), by date, with league,
+    teams, score, odds and team box scores (player ones too if players) loaded
+    up front, so reprs and reports over them run no further queries
+    """
+    query = _filter(Session.query(Match), league_id, start, end, season, type_)
+    return query.options(*_options(box_scores, players)).order_by(Match.date,
+                                                                  Match.id).all()
+
+
+def stream(league_id=None, start=None, end=None, season=None, type_=None,
+                box_scores=True, players=False, chunk_size=500, expunge=True):
+    """
+    generator over the same matches as matches() for ranges too large to hold in
+    the session: ids are read once, then every chunk_size matches are loaded
+    eagerly and, if expunge, dropped from the session once consumed
+    """
+    ids = [r[0] for r in _filter(Session.query(Match.id), league_id, start, end, season,
+                                 type_).order_by(Match.date, Match.id)]
+    for n in range(0, len(ids), chunk_size):
+        chunk = Session.query(Match).filter(Match.id.in_(ids[n:n + chunk_size])
+                    ).options(*_options(box_scores, players)).order_by(Match.date,
+                                                                       Match.id).all()
+        for match in chunk:
+            yield match
+        if expunge:
+            for match in chunk:
+                for obj in [match] + list(match.teams_stats if box_scores else []) + \
+                        list(match.players_stats if players else []) + \
+                        list(match.score) + list(match.odds):
+                    if obj in Session:
+                        Session.expunge(obj)
+
+
+def box_scores(league_id=None, start=None, end=None, season=None, type_=None,
+                players=False):
+    """
+    team (or player) box scores of the matches, each with its match, league,
+    team and player loaded
+    """
+    model = PlayerMatchStats if players else TeamMatchStats
+    query = _filter(Session.query(model).join(model.match), league_id, start, end, season,
+                    type_)
+    options = [joinedload(model.match).joinedload(Match.league),
+               joinedload(model.team)]
+    if players:
+        options.append(joinedload(PlayerMatchStats.player))
+    return query.options(*options).order_by(Match.date, model.id).all()
@@ -0,0 +1,126 @@
+import numpy as np
+
+from .snapshots import metric_names
+
+
+MEASURES = ('mean', 'sum', 'ewm')
+
+
+class Prefix(object):
+    """
+    prefix sums over the rows of a match log split in (entity, season) groups
+    """
+
+    def __init__(self, log, rows, decay):
+        self.entity = log.entity[rows]
+        self.season = log.season[rows]
+        self.league_id = log.league_id[rows]
+        self.date = log.date[rows]
+        values = log.values[rows]
+        present = ~np.isnan(values)
+        values = np.where(present, values, 0.)
+
+        starts = np.r_[True, (self.entity[1:] != self.entity[:-1]) |
+                             (self.season[1:] != self.season[:-1])] if len(rows) else \
+                 np.empty(0, dtype=bool)
+        self.group = np.cumsum(starts) - 1
+        self.keys = self.group.astype(np.int64) * (1 << 32) + self.date.astype(np.int64)
+        self.first = np.flatnonzero(starts)
+        self.last = np.r_[self.first[1:], len(rows)].astype(int)
+        self.groups = dict(((e, s), g) for g, (e, s) in
+                           enumerate(zip(self.entity[self.first].tolist(),
+                                         self.season[self.first].tolist())))
+
+        # ewm weights are relative to the start of the group to keep them bounded
+        offset = np.arange(len(rows)) - self.first[self.group] if len(rows) else \
+                 np.empty(0, dtype=int)
+        scale = decay ** -offset.astype(float)
+        self.decay = decay
+        self.sums = self._prefix(values)
+        self.counts = self._prefix(present.astype(float))
+        self.wsums = self._prefix(values * scale[:, None])
+        self.wcounts = self._prefix(present * scale[:, None])
+
+    @staticmethod
+    def _prefix(values):
+        return np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    def window(self, groups, date, n):
+        """
+        [lo, hi) row bounds of the last n matches on or before date in each group
+        """
+        first, last = self.first[groups], self.last[groups]
+        if date is None:
+            hi = last
+        else:
+            day = np.datetime64(date, 'D').astype(np.int64)
+            hi = np.searchsorted(self.keys, groups.astype(np.int64) * (1 << 32) + day,
+                                 side='right')
+        return np.maximum(first, hi - n), hi, first
+
+    def measure(self, groups, date, n, columns, measure):
+        if measure not in MEASURES:
+            raise ValueError('unknown measure %s' % measure)
+        lo, hi, first = self.window(groups, date, n)
+        if measure == 'ewm':
+            shift = (self.decay ** (hi - 1 - first).astype(float))[:, None]
+            sums = (self.wsums[hi] - self.wsums[lo])[:, columns] * shift
+            counts = (self.wcounts[hi] - self.wcounts[lo])[:, columns] * shift
+        else:
+            sums = (self.sums[hi] - self.sums[lo])[:, columns]
+            counts = (self.counts[hi] - self.counts[lo])[:, columns]
+        if measure == 'sum':
+            return np.where(counts > 0, sums, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
+
+
+class FormEngine(object):
+    """
+    rolling windows over a match log. building costs one pass over the log, after
+    which any window length, as-of date and stat list resolves in constant time per
+    entity
+    """
+
+    def __init__(self, log, decay=0.8):
+        self.log = log
+        self.decay = decay
+        self.prefixes = {}
+
+    def prefix(self, loc):
+        if loc not in self.prefixes:
+            rows = np.arange(len(self.log))
+            if loc == 'home':
+                rows = rows[self.log.home]
+            elif loc == 'away':
+                rows = rows[~self.log.home]
+            self.prefixes[loc] = Prefix(self.log, rows, self.decay)
+        return self.prefixes[loc]
+
+    def form(self, entity_id, season, date=None, n=5, measure='mean', metrics='critical',
+                loc='all'):
+        """
+        measure of metrics over the entity's last n matches of season on or before date
+        """
+        metrics = metric_names(metrics)
+        prefix = self.prefix(loc)
+        group = prefix.groups.get((entity_id, season))
+        if group is None:
+            return np.full(len(metrics), np.nan)
+        columns = [self.log.col[m] for m in metrics]
+        return prefix.measure(np.array([group]), date, n, columns, measure)[0]
+
+    def batch(self, season, date=None, n=5, measure='mean', metrics='critical', loc='all',
+                league_id=None):
+        """
+        ids of every entity with matches in season and the matrix of their form
+        """
+        metrics = metric_names(metrics)
+        prefix = self.prefix(loc)
+        groups = np.flatnonzero(prefix.season[prefix.first] == season) if len(prefix.first) \
+                 else np.empty(0, dtype=int)
+        if league_id is not None:
+            groups = groups[prefix.league_id[prefix.first[groups]] == league_id]
+        columns = [self.log.col[m] for m in metrics]
+        return prefix.entity[prefix.first[groups]], \
+               prefix.measure(groups, date, n, columns, measure)
@@ -0,0 +1,139 @@
+import numpy as np
+from sqlalchemy import union_all
+
+from . import Session
+from .overview import Match, League
+from .stats import PlayerMatchStats
+from . import signals
+from .cache import get_cache
+
+
+class MatchIndex(object):
+    """
+    sorted match dates and ids of each team or player, by season, by season and
+    match type and over the whole career, answering lookups by binary search
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    @classmethod
+    def build(cls, entity, season, date, match_id, type_):
+        index = cls()
+        order = np.lexsort((match_id, date, entity))
+        entity, season, date = entity[order], season[order], date[order]
+        match_id, type_ = match_id[order], type_[order]
+        for keys in (lambda n: (entity[n],),
+                     lambda n: (entity[n], season[n]),
+                     lambda n: (entity[n], season[n], type_[n])):
+            groups = {}
+            for n in range(len(entity)):
+                groups.setdefault(keys(n), []).append(n)
+            for key, rows in groups.items():
+                index.entries[key] = (date[rows], match_id[rows])
+        return index
+
+    @classmethod
+    def load(cls, kind):
+        """
+        index of every team or player from the database in one query
+        """
+        if kind == 'players':
+            rows = Session.query(PlayerMatchStats.player_id, League.season, Match.date,
+                        Match.id, Match.type).join(PlayerMatchStats.match).join(Match.league
+                    ).all()
+        else:
+            sides = [Session.query(side.label('team_id'), League.season, Match.date,
+                        Match.id, Match.type).join(Match.league)
+                     for side in (Match.home_id, Match.away_id)]
+            rows = Session.execute(union_all(*[s.statement for s in sides])).fetchall()
+        cols = list(zip(*rows)) or [[]] * 5
+        return cls.build(np.array(cols[0], dtype=np.int64), np.array(cols[1], dtype=object),
+                         np.array(cols[2], dtype='datetime64[D]'),
+                         np.array(cols[3], dtype=np.int64), np.array(cols[4], dtype=object))
+
+    def add(self, entity_id, season, date, match_id, type_):
+        date = np.datetime64(date, 'D')
+        for key in ((entity_id,), (entity_id, season), (entity_id, season, type_)):
+            dates, ids = self.entries.get(key, (np.empty(0, dtype='datetime64[D]'),
+                                                np.empty(0, dtype=np.int64)))
+            lo = np.searchsorted(dates, date, side='left')
+            hi = np.searchsorted(dates, date, side='right')
+            if match_id in ids[lo:hi]:
+                continue
+            self.entries[key] = (np.insert(dates, hi, date), np.insert(ids, hi, match_id))
+
+    def _before(self, key, date):
+        dates, ids = self.entries.get(key, (None, None))
+        if dates is None:
+            return None, None
+        n = len(dates) if date is None else \
+            np.searchsorted(dates, np.datetime64(date, 'D'), side='left')
+        if not n:
+            return None, None
+        return dates[n - 1].item(), int(ids[n - 1])
+
+    def last_match(self, entity_id, season, type_='Season'):
+        """
+        id of the last match of type played in season
+        """
+        return self._before((entity_id, season, type_), None)[1]
+
+    def prev_match(self, entity_id, season, date):
+        """
+        id of the immediate match played in season before date
+        """
+        return self._before((entity_id, season), date)[1]
+
+    def rest_period(self, entity_id, date):
+        """
+        days passed since the last match before date
+        """
+        last = self._before((entity_id,), date)[0]
+        return None if last is None else date - last
+
+
+class Indexes(object):
+    """
+    player and team indexes kept up to date with committed box scores
+    """
+
+    def __init__(self, players, teams):
+        self.players = players
+        self.teams = teams
+
+    def ingested(self, records):
+        for r in records:
+            getattr(self, r.kind).add(r.entity_id, r.season, r.date, r.match_id, r.type)
+
+
+_index = None
+
+
+def use_index(index):
+    """
+    makes model lookups answer from index, None goes back to the database. the
+    cached lookups are dropped, as the two may disagree
+    """
+    global _index
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
+    if _index is not None:
+        signals.unsubscribe(_index.ingested)
+    _index = index
+    if index is not None:
+        signals.subscribe(index.ingested)
+
+
+def get_index():
+    return _index
+
+
+def load():
+    """
+    builds the player and team indexes and makes them the active ones
+    """
+    index = Indexes(MatchIndex.load('players'), MatchIndex.load('teams'))
+    use_index(index)
+    return index
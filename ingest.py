@@ -0,0 +1,248 @@
+import io
+import csv
+import time
+from sqlalchemy import select
+
+from . import Session, metrics, signals
+from .upsert import upsert
+from .overview import Match, League, Team, MatchOdds
+from .personnel import Player
+from .stats import TeamMatchStats, PlayerMatchStats, Score
+
+
+class Lookups(object):
+    """
+    team, league and player ids by name, loaded once so payloads resolve without
+    a query each
+    """
+
+    def __init__(self, teams, leagues, players):
+        self.teams = teams
+        self.leagues = leagues
+        self.players = players
+
+    @classmethod
+    def load(cls):
+        return cls(dict(Session.query(Team.name, Team.id)),
+                   dict(((name, season), id_) for id_, name, season in
+                        Session.query(League.id, League.name, League.season)),
+                   dict(Session.query(Player.name, Player.id).order_by(Player.id.desc())))
+
+    def team(self, name):
+        if name not in self.teams:
+            raise ValueError('unknown team %r' % name)
+        return self.teams[name]
+
+    def league(self, name, season):
+        if (name, season) not in self.leagues:
+            raise ValueError('unknown league %r, season %r' % (name, season))
+        return self.leagues[(name, season)]
+
+    def add_players(self, names):
+        """
+        creates the players in names that are not known yet
+        """
+        names = sorted(set(n for n in names if n not in self.players))
+        if not names:
+            return 0
+        rows = [{'name': n} for n in names]
+        Session.bulk_insert_mappings(Player, rows, return_defaults=True)
+        self.players.update((r['name'], r['id']) for r in rows)
+        return len(rows)
+
+
+def _columns(model):
+    return set(c.name for c in model.__table__.columns) - set(['id'])
+
+
+def _copy(connection, table, rows):
+    """
+    COPY FROM STDIN of rows as csv, through psycopg2 or psycopg 3
+    """
+    columns = list(rows[0])
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (
+            table.name, ', '.join('"%s"' % c for c in columns))
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+    finally:
+        cursor.close()
+
+
+def insert(table, rows, chunk_size=5000):
+    """
+    inserts rows, dicts with the same keys, in chunks: COPY on postgres and
+    executemany elsewhere
+    """
+    connection = Session.connection()
+    for n in range(0, len(rows), chunk_size):
+        chunk = rows[n:n + chunk_size]
+        if connection.dialect.name == 'postgresql':
+            _copy(connection, table, chunk)
+        else:
+            connection.execute(table.insert(), chunk)
+    return len(rows)
+
+
+def _stats(model, values, **keys):
+    columns = _columns(model)
+    row = dict((c, None) for c in columns)
+    row.update((c, v) for c, v in values.items() if c in columns)
+    row.update(keys)
+    return row
+
+
+class Ingest(object):
+    """
+    batched writer of match payloads, dicts of the form
+
+        {'league': name, 'season': season, 'date': date, 'type': 'Season',
+         'home': team name, 'away': team name, 'result': '102-98',
+         'teams': {'home': {stats}, 'away': {stats}},
+         'players': [{'name': name, 'team': 'home' or 'away', stats}, ...],
+         'score': {'home_1': 25, ...}, 'odds': {'home_odds': 1.8, ...}}
+
+    with any other Match column (time, city_id, attendance...) alongside. matches
+    already in the database are skipped, or rewritten in place by upserts on
+    their natural keys when update is set, keeping their odds
+    """
+
+    def __init__(self, lookups=None, chunk_size=5000, derived=True, update=False):
+        self.lookups = lookups or Lookups.load()
+        self.chunk_size = chunk_size
+        self.derived = derived
+        self.update = update
+        self.counts = dict((k, 0) for k in ('matches', 'teams_stats', 'players_stats',
+                                            'scores', 'odds', 'players', 'skipped'))
+        self.seconds = 0.
+        self.records = []
+
+    def _key(self, payload):
+        return (self.lookups.league(payload['league'], payload['season']), payload['date'],
+                self.lookups.team(payload['home']), self.lookups.team(payload['away']))
+
+    def _existing(self, keys):
+        """
+        match ids by (league, date, home, away) of keys found in the database
+        """
+        if not keys:
+            return {}
+        dates = [k[1] for k in keys]
+        rows = Session.execute(select(Match.id, Match.league_id, Match.date, Match.home_id,
+                    Match.away_id).where(Match.league_id.in_(set(k[0] for k in keys)))
+                    .where(Match.date.between(min(dates), max(dates)))).fetchall()
+        keys = set(keys)
+        return dict((tuple(r[1:]), r[0]) for r in rows if tuple(r[1:]) in keys)
+
+    def _write(self, model, rows):
+        if self.update and model is not MatchOdds:
+            return upsert(model, rows)
+        return insert(model.__table__, rows, self.chunk_size)
+
+    def batch(self, payloads):
+        """
+        writes one chunk of payloads
+        """
+        keyed = [(self._key(p), p) for p in payloads]
+        existing = self._existing([k for k, _ in keyed])
+        fresh, seen = [], set() if self.update else set(existing)
+        for key, payload in keyed:
+            if key not in seen:
+                fresh.append((key, payload))
+                seen.add(key)
+        self.counts['skipped'] += len(keyed) - len(fresh)
+        if not fresh:
+            return []
+
+        match_columns = _columns(Match)
+        self.counts['players'] += self.lookups.add_players(
+                [p['name'] for _, payload in fresh for p in payload.get('players', [])])
+        matches = []
+        for (league_id, date, home_id, away_id), payload in fresh:
+            row = dict((c, None) for c in match_columns)
+            row.update((c, v) for c, v in payload.items() if c in match_columns)
+            row.update(league_id=league_id, date=date, home_id=home_id, away_id=away_id)
+            matches.append(row)
+        self.counts['matches'] += self._write(Match, matches)
+        ids = self._existing([k for k, _ in fresh])
+
+        teams, players, scores, odds = [], [], [], []
+        for key, payload in fresh:
+            match_id = ids[key]
+            sides = {'home': key[2], 'away': key[3]}
+            for side, values in payload.get('teams', {}).items():
+                teams.append(_stats(TeamMatchStats, values, match_id=match_id,
+                                    team_id=sides[side]))
+            for values in payload.get('players', []):
+                players.append(_stats(PlayerMatchStats, values, match_id=match_id,
+                                      team_id=sides[values['team']],
+                                      player_id=self.lookups.players[values['name']]))
+            if payload.get('score'):
+                scores.append(_stats(Score, payload['score'], match_id=match_id))
+            if payload.get('odds') and key not in existing:
+                odds.append(_stats(MatchOdds, payload['odds'], match_id=match_id))
+        for name, model, rows in (('teams_stats', TeamMatchStats, teams),
+                                  ('players_stats', PlayerMatchStats, players),
+                                  ('scores', Score, scores), ('odds', MatchOdds, odds)):
+            if rows:
+                self.counts[name] += self._write(model, rows)
+
+        match_ids = [ids[key] for key, _ in fresh]
+        if self.derived:
+            metrics.update_box_scores(match_ids)
+        info = dict((ids[key], (key[0], payload['season'], key[1], payload.get('type'),
+                                key[2])) for key, payload in fresh)
+        for kind, rows, key in (('teams', teams, 'team_id'), ('players', players, 'player_id')):
+            for r in rows:
+                league_id, season, date, type_, home_id = info[r['match_id']]
+                self.records.append(signals.Ingested(kind, r[key], r['team_id'], r['match_id'],
+                                    league_id, season, date, type_, r['team_id'] == home_id))
+        return match_ids
+
+    def run(self, payloads, batch_size=1000):
+        """
+        writes every payload of an iterable in batches of batch_size matches,
+        committing once at the end, and returns the report
+        """
+        start = time.perf_counter()
+        batch = []
+        try:
+            for payload in payloads:
+                batch.append(payload)
+                if len(batch) >= batch_size:
+                    self.batch(batch)
+                    batch = []
+            if batch:
+                self.batch(batch)
+            Session.commit()
+        except Exception:
+            Session.rollback()
+            raise
+        self.seconds += time.perf_counter() - start
+        signals.notify(self.records)
+        self.records = []
+        return self.report()
+
+    def report(self):
+        rows = sum(v for k, v in self.counts.items() if k != 'skipped')
+        rv = dict(self.counts)
+        rv.update({'rows': rows, 'seconds': self.seconds,
+                   'rows_per_second': rows / self.seconds if self.seconds else None})
+        return rv
+
+
+def ingest(payloads, batch_size=1000, chunk_size=5000, derived=True, update=False):
+    """
+    writes match payloads in bulk, see Ingest
+    """
+    return Ingest(chunk_size=chunk_size, derived=derived, update=update).run(payloads,
+                                                                             batch_size)
@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import time
+import contextlib
+from collections import namedtuple
+import sqlalchemy
+from sqlalchemy import event
+
+from . import Session
+
+
+Query = namedtuple('Query', ['site', 'statement', 'seconds', 'rows', 'hydration'])
+
+_skip = (os.path.dirname(sqlalchemy.__file__), os.path.splitext(__file__)[0],
+         os.path.splitext(contextlib.__file__)[0])
+_active = []
+_installed = []
+# engines installed by track(), until the outermost block exits
+_tracked = []
+_nested = []
+
+
+def _call_site():
+    """
+    file:line function of the innermost frame outside sqlalchemy and this module
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_skip):
+            return '%s:%d %s' % (os.path.basename(filename), frame.f_lineno,
+                                 frame.f_code.co_name)
+        frame = frame.f_back
+    return '?'
+
+
+def _shape(statement):
+    """
+    statement with literals and IN lists collapsed, so queries differing only in
+    their parameters compare equal
+    """
+    statement = re.sub(r"'[^']*'|\b\d+(\.\d+)?\b", '?', statement)
+    statement = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?)', statement)
+    return ' '.join(statement.split())
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('instrument_start', []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('instrument_start')
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    if not _active:
+        return
+    query = Query(_call_site(), _shape(statement), seconds, None, 0.)
+    for tracker in _active:
+        tracker.queries.append(query)
+
+
+def _orm_execute(state):
+    """
+    runs ORM selects eagerly to time the fetch and hydration of their rows,
+    leaving streamed ones (yield_per, stream_results) and DML, which has no rows
+    to freeze, alone. time spent in loads nested inside (selectin and the like)
+    is left to them
+    """
+    options = state.execution_options
+    if not _active or not state.is_select or options.get('yield_per') or \
+            options.get('stream_results'):
+        return None
+    marks = [len(t.queries) for t in _active]
+    _nested.append([0., 0.])
+    start = time.perf_counter()
+    try:
+        frozen = state.invoke_statement().freeze()
+    finally:
+        seconds = time.perf_counter() - start
+        nested_seconds, nested_sql = _nested.pop()
+    sql = 0.
+    for tracker, mark in zip(list(_active), marks):
+        issued = tracker.queries[mark:]
+        if issued:
+            sql = sum(q.seconds for q in issued)
+            hydration = max(seconds - nested_seconds - (sql - nested_sql), 0.)
+            tracker.queries[mark] = issued[0]._replace(rows=len(frozen.data),
+                                                       hydration=hydration)
+    if _nested:
+        _nested[-1][0] += seconds
+        _nested[-1][1] += sql
+    return frozen()
+
+
+def install(engine=None):
+    """
+    starts listening to engine, the one Session is bound to by default, and to
+    Session. nothing is recorded outside track(). returns the engine if it was
+    not listened to already
+    """
+    engine = engine or Session.get_bind()
+    if any(e is engine for e, _ in _installed):
+        return None
+    event.listen(engine, 'before_cursor_execute', _before)
+    event.listen(engine, 'after_cursor_execute', _after)
+    if not any(e is None for e, _ in _installed):
+        event.listen(Session, 'do_orm_execute', _orm_execute)
+        _installed.append((None, Session))
+    _installed.append((engine, None))
+    return engine
+
+
+def uninstall(engine=None):
+    """
+    stops listening to engine, or to every engine when None, and to Session
+    once no engine is left
+    """
+    for e, session in list(_installed):
+        if e is not None and (engine is None or e is engine):
+            event.remove(e, 'before_cursor_execute', _before)
+            event.remove(e, 'after_cursor_execute', _after)
+            _installed.remove((e, session))
+    if not any(e is not None for e, _ in _installed):
+        for e, session in list(_installed):
+            event.remove(session, 'do_orm_execute', _orm_execute)
+            _installed.remove((e, session))
+
+
+class Tracker(object):
+    """
+    statements issued during one logical operation, by call site. a statement of
+    the same shape repeated threshold times or more from one call site is an N+1
+    suspect
+    """
+
+    def __init__(self, label=None, threshold=5):
+        self.label = label
+        self.threshold = threshold
+        self.queries = []
+        self.seconds = 0.
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def sql_seconds(self):
+        return sum(q.seconds for q in self.queries)
+
+    def sites(self):
+        """
+        statements, SQL seconds, rows fetched and hydration seconds per call site
+        """
+        rv = {}
+        for q in self.queries:
+            site = rv.setdefault(q.site, {'queries': 0, 'seconds': 0., 'rows': 0,
+                                          'hydration': 0.})
+            site['queries'] += 1
+            site['seconds'] += q.seconds
+            site['rows'] += q.rows or 0
+            site['hydration'] += q.hydration
+        return rv
+
+    def suspects(self):
+        """
+        (call site, statement shape, repetitions) of the N+1 suspects
+        """
+        counts = {}
+        for q in self.queries:
+            counts[(q.site, q.statement)] = counts.get((q.site, q.statement), 0) + 1
+        return sorted([(site, shape, n) for (site, shape), n in counts.items()
+                       if n >= self.threshold], key=lambda s: -s[2])
+
+    def report(self):
+        return {'label': self.label, 'queries': len(self.queries), 'seconds': self.seconds,
+                'sql_seconds': self.sql_seconds,
+                'rows': sum(q.rows or 0 for q in self.queries),
+                'hydration': sum(q.hydration for q in self.queries),
+                'sites': self.sites(), 'suspects': self.suspects()}
+
+    def summary(self):
+        report = self.report()
+        lines = ['%s: %d queries, %.1f ms total, %.1f ms in SQL, %d rows, %.1f ms hydrating'
+                 % (self.label or 'operation', report['queries'], report['seconds'] * 1000,
+                    report['sql_seconds'] * 1000, report['rows'],
+                    report['hydration'] * 1000)]
+        for site, s in sorted(report['sites'].items(), key=lambda s: -s[1]['seconds']):
+            lines.append('  %-50s %5d queries %9.1f ms %7d rows %9.1f ms hydrating'
+                         % (site, s['queries'], s['seconds'] * 1000, s['rows'],
+                            s['hydration'] * 1000))
+        for site, shape, n in report['suspects']:
+            lines.append('  N+1 suspect: %d x at %s: %s' % (n, site, shape[:120]))
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def track(label=None, threshold=5, engine=None):
+    """
+    records the statements issued inside the block, listening to engine only for
+    the time of the outermost block unless installed beforehand:
+
+        with track('season report') as tracker:
+            ...
+        print(tracker.summary())
+    """
+    installed = install(engine)
+    if installed is not None:
+        _tracked.append(installed)
+    tracker = Tracker(label, threshold)
+    _active.append(tracker)
+    start = time.perf_counter()
+    try:
+        yield tracker
+    finally:
+        tracker.seconds = time.perf_counter() - start
+        _active.remove(tracker)
+        # the outermost block stops listening to the engines track() installed
+        if not _active:
+            for e in _tracked:
+                uninstall(e)
+            del _tracked[:]
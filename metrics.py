@@ -0,0 +1,163 @@
+import numpy as np
+
+from . import Session
+from .stats import TeamMatchStats, PlayerMatchStats, COUNTING_STATS
+
+
+def frame(values, columns=COUNTING_STATS):
+    """
+    column views of a (rows, columns) matrix of counting stats keyed by name
+    """
+    values = np.asarray(values, dtype=float).reshape(-1, len(columns))
+    return dict((c, values[:, n]) for n, c in enumerate(columns))
+
+
+def _div(num, den):
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=float), np.asarray(den, dtype=float))
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def possessions(s):
+    return s['FGA'] + 0.44 * s['FTA'] - s['ORB'] + s['TOV']
+
+
+def compute(own, team=None, opp=None):
+    """
+    derived columns of a batch of box scores. own holds the counting stats of each
+    row, team those of the row's team (players only) and opp those of the opponent
+    team. any denominator that is zero gives nan. AORtg/ADRtg need league context
+    and are left out
+    """
+    s = own
+    scoring = s['FGA'] + 0.44 * s['FTA']
+    rv = {
+        'FGP': _div(s['FG'], s['FGA']),
+        'TWOP': _div(s['TWO'], s['TWOA']),
+        'TWOAr': _div(s['TWOA'], s['FGA']),
+        'THRP': _div(s['THR'], s['THRA']),
+        'THRAr': _div(s['THRA'], s['FGA']),
+        'FTP': _div(s['FT'], s['FTA']),
+        'FTAr': _div(s['FTA'], s['FGA']),
+        'FT_to_FGA': _div(s['FT'], s['FGA']),
+        'EFGP': _div(s['FG'] + 0.5 * s['THR'], s['FGA']),
+        'TSA': scoring,
+        'TSP': _div(s['PTS'], 2 * scoring),
+        'ORBr': _div(s['ORB'], s['TRB']),
+        'DRBr': _div(s['DRB'], s['TRB']),
+        'AST_to_TOV': _div(s['AST'], s['TOV']),
+        'STL_to_TOV': _div(s['STL'], s['TOV']),
+        'TOVP': _div(s['TOV'], scoring + s['TOV']),
+        'FIC': s['PTS'] + s['ORB'] + 0.75 * s['DRB'] + s['AST'] + s['STL'] + s['BLK']
+               - 0.75 * s['FGA'] - 0.375 * s['FTA'] - s['TOV'] - 0.5 * s['PF'],
+    }
+    if opp is None:
+        return rv
+
+    o = opp
+    if team is None:
+        pos, opos = possessions(s), possessions(o)
+        rv.update({
+            'OPOS': pos,
+            'DPOS': opos,
+            'ORBP': _div(s['ORB'], s['ORB'] + o['DRB']),
+            'DRBP': _div(s['DRB'], s['DRB'] + o['ORB']),
+            'TRBP': _div(s['TRB'], s['TRB'] + o['TRB']),
+            'ASTP': _div(s['AST'], s['FG']),
+            'STLP': _div(s['STL'], opos),
+            'BLKP': _div(s['BLK'], o['FGA'] - o['THRA']),
+            'USGP': np.where(s['MP'] > 0, 1., np.nan),
+            'ORtg': 100 * _div(s['PTS'], pos),
+            'DRtg': 100 * _div(o['PTS'], opos),
+            'PACE': 48 * _div(pos + opos, 2 * _div(s['MP'], 5)),
+        })
+        return rv
+
+    t = team
+    share = _div(t['MP'] / 5, s['MP'])
+    tpos, opos = possessions(t), possessions(o)
+    rv.update({
+        'ORBP': share * _div(s['ORB'], t['ORB'] + o['DRB']),
+        'DRBP': share * _div(s['DRB'], t['DRB'] + o['ORB']),
+        'TRBP': share * _div(s['TRB'], t['TRB'] + o['TRB']),
+        'ASTP': _div(s['AST'], _div(s['MP'], t['MP'] / 5) * t['FG'] - s['FG']),
+        'STLP': share * _div(s['STL'], opos),
+        'BLKP': share * _div(s['BLK'], o['FGA'] - o['THRA']),
+        'USGP': share * _div(scoring + s['TOV'], t['FGA'] + 0.44 * t['FTA'] + t['TOV']),
+        'ORtg': 100 * _div(s['PTS'], scoring + s['TOV']),
+        'DRtg': 100 * _div(o['PTS'], opos),
+        'PACE': 48 * _div(tpos + opos, 2 * _div(t['MP'], 5)),
+        'HOB': _div(s['FG'] + s['AST'], t['FG']),
+    })
+    return rv
+
+
+def pair(match_id, team_id, team_match_id, team_team_id):
+    """
+    positions in the team box scores (team_match_id, team_team_id) of the own team
+    and of the opponent of each (match_id, team_id) row, -1 where missing
+    """
+    match_id, team_id = np.asarray(match_id), np.asarray(team_id)
+    team_match_id, team_team_id = np.asarray(team_match_id), np.asarray(team_team_id)
+    if not len(team_match_id):
+        missing = np.full(len(match_id), -1)
+        return missing, missing
+
+    order = np.lexsort((team_team_id, team_match_id))
+    matches, teams = team_match_id[order], team_team_id[order]
+    first = np.searchsorted(matches, match_id, side='left')
+    last = np.searchsorted(matches, match_id, side='right')
+    # every match has two team box scores
+    found = last - first == 2
+    lo, hi = np.minimum(first, len(order) - 1), np.minimum(first + 1, len(order) - 1)
+    own_lo = found & (teams[lo] == team_id)
+    own_hi = found & (teams[hi] == team_id)
+    own = np.where(own_lo, order[lo], np.where(own_hi, order[hi], -1))
+    opp = np.where(own_lo, order[hi], np.where(own_hi, order[lo], -1))
+    return own, opp
+
+
+def _take(values, pos):
+    rv = values[np.maximum(pos, 0)]
+    rv[pos < 0] = np.nan
+    return rv
+
+
+def update_box_scores(match_ids):
+    """
+    fills the derived columns of the team and player box scores of matches
+    """
+    match_ids = list(match_ids)
+    teams = Session.query(TeamMatchStats.id, TeamMatchStats.match_id, TeamMatchStats.team_id,
+                *[getattr(TeamMatchStats, c) for c in COUNTING_STATS]
+            ).filter(TeamMatchStats.match_id.in_(match_ids)).all()
+    players = Session.query(PlayerMatchStats.id, PlayerMatchStats.match_id,
+                PlayerMatchStats.team_id, *[getattr(PlayerMatchStats, c) for c in COUNTING_STATS]
+            ).filter(PlayerMatchStats.match_id.in_(match_ids)).all()
+
+    updated = 0
+    team_values = np.array([[np.nan if v is None else float(v) for v in r[3:]] for r in teams]
+                           ).reshape(len(teams), len(COUNTING_STATS))
+    team_match = np.array([r[1] for r in teams], dtype=np.int64)
+    team_team = np.array([r[2] for r in teams], dtype=np.int64)
+    for model, rows in ((TeamMatchStats, teams), (PlayerMatchStats, players)):
+        if not rows:
+            continue
+        values = np.array([[np.nan if v is None else float(v) for v in r[3:]] for r in rows])
+        own, opp = pair([r[1] for r in rows], [r[2] for r in rows], team_match, team_team)
+        if model is TeamMatchStats:
+            derived = compute(frame(values), opp=frame(_take(team_values, opp)))
+        else:
+            derived = compute(frame(values), frame(_take(team_values, own)),
+                              frame(_take(team_values, opp)))
+        names = [c for c in derived if hasattr(model, c)]
+        mappings = []
+        for n, r in enumerate(rows):
+            mapping = dict((c, None if np.isnan(derived[c][n]) else float(derived[c][n]))
+                           for c in names)
+            mapping['id'] = r[0]
+            mappings.append(mapping)
+        Session.bulk_update_mappings(model, mappings)
+        updated += len(mappings)
+    return updated
@@ -1,16 +1,12 @@
-import os
-import sys
-sys.path.append(os.path.abspath('.'))
-
 import datetime
 from collections import defaultdict
 from sqlalchemy import Column, Integer, Numeric, String, ForeignKey, Date, Time, \
                        UniqueConstraint, create_engine, tuple_, or_, and_, func
 from sqlalchemy.orm import relationship
-import numpy as np 
 
 from . import Session, Base, enums
-from stats import TeamMatchStats, TeamSeasonStats, TeamSeasonHomeStats, TeamSeasonAwayStats
+from .cache import cached
+from .stats import TeamMatchStats, TeamSeasonStats, TeamSeasonHomeStats, TeamSeasonAwayStats
 
 
 class Country(Base):
@@ -32,7 +28,7 @@ class City(Base):
     country = relationship('Country', backref='cities')
     teams = relationship('Team', secondary='cities_teams')
 
-    UniqueConstraint(name, country_id)
+    __table_args__ = (UniqueConstraint('name', 'country_id'),)
 
 
 class CityDistance(Base):
@@ -68,7 +64,7 @@ class Stadium(Base):
     zipcode = Column(String)
     teams = relationship('Team', secondary='stadiums_teams')
 
-    UniqueConstraint(name, country_id)
+    __table_args__ = (UniqueConstraint('name', 'country_id'),)
 
     def __repr__(self):
         #return '{name: %s, country: %s, local_teams: %s' % (self.name,
@@ -93,7 +89,7 @@ class League(Base):
     country_id = Column(ForeignKey('countries.id'), nullable=False, index=True)
     country = relationship('Country', backref='leagues', uselist=False)
 
-    UniqueConstraint(name, season, country_id)
+    __table_args__ = (UniqueConstraint('name', 'season', 'country_id'),)
 
     def __repr__(self):
         return '{league: %s - %s, country: %s}' % (self.name, self.season, self.country)
@@ -112,11 +108,63 @@ class Team(Base):
     players = relationship('Player', secondary='contracts')
     stadiums = relationship('Stadium', secondary='stadiums_teams')
 
-    UniqueConstraint(name, country_id)
+    __table_args__ = (UniqueConstraint('name', 'country_id'),)
 
     def __repr__(self):
         return '{name: %s, country: %s}' % (self.name, self.country.name)
 
+    @classmethod
+    @cached('teams', 'ids')
+    def bulk_season_stats(cls, ids, season, date, metrics='critical', loc='all', type_=None,
+                            as_dict=False):
+        """
+        season stats of many teams as of date in a single query
+        """
+        from .snapshots import bulk_season_stats
+        return bulk_season_stats('teams', ids, season, date, metrics=metrics, loc=loc,
+                                 type_=type_, as_dict=as_dict)
+
+    def _matches(self):
+        return Session.query(Match).join(Match.league).filter(
+                or_(Match.home_id == self.id, Match.away_id == self.id))
+
+    def last_match(self, season):
+        """
+        returns last match played by team in given season
+        """
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            match_id = index.teams.last_match(self.id, season)
+            return Session.get(Match, match_id) if match_id else None
+        return self._matches().filter(League.season == season).filter(Match.type == 'Season'
+                ).order_by(Match.date.desc()).first()
+
+    def prev_match(self, season, date):
+        """
+        returns the immediate match played by team in season before date
+        """
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            match_id = index.teams.prev_match(self.id, season, date)
+            return Session.get(Match, match_id) if match_id else None
+        return self._matches().filter(League.season == season).filter(Match.date < date
+                ).order_by(Match.date.desc()).first()
+
+    def rest_period(self, date=None):
+        """
+        calculate days passed since team last match
+        """
+        if not date:
+            date = datetime.date.today()
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            return index.teams.rest_period(self.id, date)
+        match = self._matches().filter(Match.date < date).order_by(Match.date.desc()).first()
+        return date - match.date if match else None
+
 
 class Match(Base):
     __tablename__ = 'matches'
@@ -139,7 +187,7 @@ class Match(Base):
     duration = Column(Integer, nullable=True)
     result = Column(String, nullable=False)
 
-    UniqueConstraint(date, home_id, away_id)
+    __table_args__ = (UniqueConstraint('date', 'home_id', 'away_id'),)
 
     def __repr__(self):
         return '{date: %s, league: %s, home: %s, away: %s, result: %s}' \
@@ -155,7 +203,7 @@ class MatchSquawkaCode(Base):
     match = relationship('Match', backref='b_reference', uselist=False)
     code = Column(String, nullable=False)
 
-    UniqueConstraint(match_id, code)
+    __table_args__ = (UniqueConstraint('match_id', 'code'),)
 
     def __repr__(self):
         return '{match: %s, code: %s}' % (str(self.match), self.code)
@@ -0,0 +1,83 @@
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import Session
+
+
+def _init():
+    """
+    runs in every worker. the package engine and sessions are already dropped
+    after the fork (see the package's register_at_fork); an engine Session was
+    bound to explicitly forgets the connections inherited from the parent,
+    without closing them under it, and keeps its options
+    """
+    bind = Session.session_factory.kw.get('bind')
+    if bind is None:
+        return
+    try:
+        bind.dispose(close=False)
+    except TypeError:
+        bind.pool = bind.pool.recreate()
+
+
+def _context():
+    """
+    fork context when workers can reach the same database, None otherwise:
+    fork is not available or the database lives in this process' memory
+    """
+    url = Session.get_bind().url
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return None
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def _call(fn, item):
+    start = time.perf_counter()
+    rv = fn(item)
+    return item, rv, time.perf_counter() - start
+
+
+def imap(fn, items, processes=None):
+    """
+    yields (item, fn(item), seconds) for every item as soon as it completes,
+    across a pool of forked processes. fn must be a module level function and
+    its results picklable. runs in process when there is one item or one worker,
+    or the database is in memory
+    """
+    items = list(items)
+    workers = min(processes or multiprocessing.cpu_count(), len(items))
+    context = _context() if workers > 1 else None
+    if context is None:
+        for item in items:
+            yield _call(fn, item)
+        return
+    Session.commit()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init) as pool:
+        for future in as_completed([pool.submit(_call, fn, item) for item in items]):
+            yield future.result()
+
+
+def map(fn, items, processes=None):
+    """
+    [fn(item) for item in items] across a pool of forked processes, in order
+    """
+    items = list(items)
+    results = dict((item[0], rv) for item, rv, _ in imap(_indexed(fn), enumerate(items),
+                                                          processes))
+    return [results[n] for n in range(len(items))]
+
+
+class _indexed(object):
+    """
+    fn over the item of (position, item) pairs, picklable for the pool
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, item):
+        return self.fn(item[1])
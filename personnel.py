@@ -1,12 +1,13 @@
 import datetime
 from sqlalchemy import Column, Integer, Numeric, String, ForeignKey, Date, UniqueConstraint, \
-                    or_, and_
+                    or_, and_, func
 from sqlalchemy.orm import relationship
-import numpy as np
 
 from . import Session, Base
-from overview import Match, League
-from stats import PlayerMatchStats, PlayerSeasonStats, PlayerSeasonHomeStats, PlayerSeasonAwayStats
+from .overview import Match, League
+from .stats import PlayerMatchStats, PlayerSeasonStats, PlayerSeasonHomeStats, PlayerSeasonAwayStats, \
+                  PLAYER_STATS
+from .cache import cached
 
 
 class Player(Base):
@@ -25,48 +26,108 @@ class Player(Base):
     experience = Column(Numeric)
     #first_year_ncaa = Column(Integer, nullable=True)
 
-    UniqueConstraint(name, birth_date, college_id)
+    __table_args__ = (UniqueConstraint('name', 'birth_date'),)
   
     def __repr__(self):
         return 'Player({0}, {1}, {2}, {3})'.format(self.id, self.name, 
                 self.birth_date, self.position)
 
+    @cached('players')
     def season_stats(self, season, date=None, measure='mean', metrics='critical',
                         loc='all', type_='all', per36=False, complete=False):
         """
-        return season's averages for all the stats
+        return the season snapshot of the stats as of date (of the last regular
+        season match if no date, None for every metric if there is none), the same
+        from the store as from the database
         """
+        from .snapshots import metric_names
+        from .store import get_store
+        metrics = metric_names(metrics)
         if not date:
-            date = self.last_match(season).date
-
-        if loc == 'all':
-            table = PlayerSeasonStats
-        elif loc == 'home':
-            table = PlayerSeasonHomeStats
-        elif loc == 'away':
-            table = PlayerSeasonAwayStats
-
-        stats = Session.query(table).join(table.league
-                ).filter(League.season == season).filter(table.date == date
-                ).filter(table.player == self).first()
-
-        # calculate player season stats up to date
-        if metrics == 'critical':
-            factors = metrics = ['EFGP', 'TOVP', 'ORBP', 'FT_to_FGA', 'DRBP']
-            stats = [getattr(stats, m) for m in factors]
-        elif metrics == 'raw':
-            metrics = RAW_STATS
-            stats = [getattr(stats, s) for s in RAW_STATS]
-        
+            match = self.last_match(season)
+            if match is None:
+                stats = [None] * len(metrics)
+                return dict(zip(metrics, stats)) if complete else stats
+            date = match.date
+        store = get_store()
+        stats = None
+        if store is not None:
+            stats = store.season_stats('players', self.id, season, date, metrics, loc=loc)
+        if stats is None:
+            if loc == 'all':
+                table = PlayerSeasonStats
+            elif loc == 'home':
+                table = PlayerSeasonHomeStats
+            elif loc == 'away':
+                table = PlayerSeasonAwayStats
+
+            row = Session.query(table).join(table.league
+                    ).filter(League.season == season).filter(table.date <= date
+                    ).filter(table.player == self).order_by(table.date.desc()).first()
+            stats = [getattr(row, m) if row is not None else None for m in metrics]
+        stats = [None if v is None or v != v else float(v) for v in stats]
+
+        if complete:
+            stats = dict(zip(metrics, stats))
+        return stats
+
+    @classmethod
+    @cached('players', 'ids')
+    def bulk_season_stats(cls, ids, season, date, metrics='critical', loc='all',
+                            as_dict=False):
+        """
+        season stats of many players as of date in a single query
+        """
+        from . import snapshots
+        return snapshots.bulk_season_stats('players', ids, season, date, metrics=metrics, loc=loc,
+                                 as_dict=as_dict)
+
+    @cached('players')
+    def form(self, season, date=None, measure='mean',  metrics='critical', loc='all', n=5,
+                complete=False):
+        """
+        calculates stats produced for the last n matches
+        """
+        from .form import FormEngine
+        from .snapshots import metric_names
+        from .store import MatchLog, get_store
+        metrics = metric_names(metrics)
+        store = get_store()
+        if store is not None:
+            engine = store.form_engine('players')
+        else:
+            log = MatchLog(PlayerMatchStats, 'player_id', PLAYER_STATS)
+            log.extend(log.query().filter(PlayerMatchStats.player_id == self.id
+                    ).filter(League.season == season).all())
+            engine = FormEngine(log)
+        stats = engine.form(self.id, season, date, n=n, measure=measure, metrics=metrics,
+                            loc=loc).tolist()
         if complete:
             stats = dict(zip(metrics, stats))
         return stats
 
-    def form(self, season, date=None, measure='mean',  metrics='critical', loc='all'):
+    @classmethod
+    @cached('players', None)
+    def bulk_form(cls, season, date=None, measure='mean', metrics='critical', loc='all',
+                    n=5, league_id=None):
         """
-        calculates stats produced for the last five matches
+        form of every player with matches in season, from the active store or
+        else from the season's match log loaded in one query
         """
-        pass
+        from .form import FormEngine
+        from .store import MatchLog, get_store
+        store = get_store()
+        if store is not None:
+            engine = store.form_engine('players')
+        else:
+            log = MatchLog(PlayerMatchStats, 'player_id', PLAYER_STATS)
+            query = log.query().filter(League.season == season)
+            if league_id is not None:
+                query = query.filter(Match.league_id == league_id)
+            log.extend(query.all())
+            engine = FormEngine(log)
+        return engine.batch(season, date, n=n, measure=measure, metrics=metrics, loc=loc,
+                            league_id=league_id)
 
     def wins_produced(self, date=None):
         if not date:
@@ -78,10 +139,14 @@ class Player(Base):
         """
         if not date:
             date = datetime.date.today()
-        MP = Session.query(PlayerMatchStats.MP).join(PlayerMatchStats.match 
+        from .store import get_store
+        store = get_store()
+        if store is not None:
+            return store.mins_played('players', self.id, date)
+        MP = Session.query(func.sum(PlayerMatchStats.MP)).join(PlayerMatchStats.match
                   ).filter(PlayerMatchStats.player == self).filter(Match.date < date
-                  ).filter(Match.type == 'Post-Season').all()
-        return sum([min[0] for min in MP if min[0]]) / 15
+                  ).filter(Match.date >= date - datetime.timedelta(15)).scalar()
+        return float(MP or 0) / 15
 
     def rest_period(self, date=None):
         """
@@ -89,9 +154,15 @@ class Player(Base):
         """
         if not date:
             date = datetime.date.today()
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            return index.players.rest_period(self.id, date)
         rv = Session.query(PlayerMatchStats).join(PlayerMatchStats.match 
                   ).filter(PlayerMatchStats.player == self).filter(Match.date < date
                   ).order_by(Match.date.desc()).first()
+        if rv is None:
+            return None
         last_match_date = rv.match.date
         return (date - last_match_date)
 
@@ -99,6 +170,11 @@ class Player(Base):
         """
         returns last match played by team in given season
         """
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            match_id = index.players.last_match(self.id, season)
+            return Session.get(Match, match_id) if match_id else None
         match = Session.query(Match).join(Match.league).join(Match.players_stats
                 ).filter(PlayerMatchStats.player == self).filter(League.season == season
                 ).filter(Match.type == 'Season').order_by(Match.date.desc()).first()
@@ -108,6 +184,11 @@ class Player(Base):
         """
         returns the immediate match played by player in season before date
         """
+        from .index import get_index
+        index = get_index()
+        if index is not None:
+            match_id = index.players.prev_match(self.id, season, date)
+            return Session.get(Match, match_id) if match_id else None
         match = Session.query(Match).join(Match.players_stats
                 ).join(Match.league).filter(PlayerMatchStats.player == self
                 ).filter(League.season == season).filter(Match.date < date
@@ -0,0 +1,187 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import functools
+import contextlib
+import tracemalloc
+import types
+
+MODES = ('cpu', 'memory')
+
+
+class Profiler(object):
+    """
+    aggregates cProfile (cpu) or tracemalloc (memory) measurements over every
+    call of the functions it wraps, plus calls and wall time per function
+    """
+
+    def __init__(self, mode='cpu', frames=1):
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s' % (MODES,))
+        self.mode = mode
+        self.frames = frames
+        self.profile = cProfile.Profile() if mode == 'cpu' else None
+        self.allocations = {}
+        self.peak = 0
+        self.calls = {}
+        self.depth = 0
+        self._patched = []
+        self._tracing = False
+
+    def _start(self):
+        if self.mode == 'cpu':
+            self.profile.enable()
+            return None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._tracing = True
+        tracemalloc.reset_peak()
+        return tracemalloc.take_snapshot()
+
+    def _stop(self, before):
+        if self.mode == 'cpu':
+            self.profile.disable()
+            return
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        after = tracemalloc.take_snapshot()
+        for stat in after.compare_to(before, 'lineno'):
+            if not stat.size_diff and not stat.count_diff:
+                continue
+            frame = stat.traceback[0]
+            key = '%s:%d' % (frame.filename, frame.lineno)
+            size, count = self.allocations.get(key, (0, 0))
+            self.allocations[key] = (size + stat.size_diff, count + stat.count_diff)
+
+    def wrap(self, fn, name=None):
+        """
+        fn measured on every call. calls nested inside a measured one only count
+        towards calls and wall time
+        """
+        name = name or getattr(fn, '__qualname__', fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            outer = not self.depth
+            self.depth += 1
+            state = self._start() if outer else None
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                if outer:
+                    self._stop(state)
+                self.depth -= 1
+                calls, total = self.calls.get(name, (0, 0.))
+                self.calls[name] = (calls + 1, total + seconds)
+        return wrapper
+
+    def patch(self, target, names=None):
+        """
+        wraps in place the public methods of a class (Player, TeamMatchStats...)
+        or the public functions of a module, or just names, until restore()
+        """
+        if names is None:
+            module = isinstance(target, types.ModuleType)
+            names = [n for n, v in vars(target).items() if not n.startswith('_')
+                     and (isinstance(v, (classmethod, staticmethod)) and not module or
+                          isinstance(v, types.FunctionType) and
+                          (not module or v.__module__ == target.__name__))]
+        for n in names:
+            original = vars(target).get(n, getattr(target, n))
+            if isinstance(original, (classmethod, staticmethod)):
+                kind = type(original)
+                wrapped = kind(self.wrap(original.__func__,
+                                         '%s.%s' % (target.__name__, n)))
+            elif callable(original):
+                wrapped = self.wrap(original, '%s.%s' % (target.__name__, n))
+            else:
+                continue
+            self._patched.append((target, n, original))
+            setattr(target, n, wrapped)
+        return self
+
+    def restore(self):
+        while self._patched:
+            target, name, original = self._patched.pop()
+            setattr(target, name, original)
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def run(self, fn, *args, **kwargs):
+        """
+        calls fn (a batch job) under the profiler
+        """
+        return self.wrap(fn)(*args, **kwargs)
+
+    def report(self, limit=30, sort='cumulative'):
+        """
+        wrapped calls and the top limit entries: functions by sort for cpu,
+        source lines by bytes allocated for memory
+        """
+        rv = {'mode': self.mode, 'calls': dict(
+                (n, {'calls': c, 'seconds': s, 'mean': s / c if c else 0.})
+                for n, (c, s) in self.calls.items())}
+        if self.mode == 'cpu':
+            stats = pstats.Stats(self.profile)
+            key = {'cumulative': 3, 'tottime': 2, 'calls': 1}[sort]
+            entries = sorted(stats.stats.items(), key=lambda e: -e[1][key])[:limit]
+            rv['top'] = [{'function': '%s:%d(%s)' % f, 'calls': s[1], 'tottime': s[2],
+                          'cumtime': s[3]} for f, s in entries]
+        else:
+            entries = sorted(self.allocations.items(), key=lambda e: -abs(e[1][0]))[:limit]
+            rv['peak'] = self.peak
+            rv['top'] = [{'line': line, 'bytes': size, 'blocks': count}
+                         for line, (size, count) in entries]
+        return rv
+
+    def text(self, limit=30, sort='cumulative'):
+        report = self.report(limit, sort)
+        lines = ['%-50s %8s %10s %10s' % ('call', 'calls', 'seconds', 'mean ms')]
+        for name, c in sorted(report['calls'].items(), key=lambda c: -c[1]['seconds']):
+            lines.append('%-50s %8d %10.3f %10.3f' % (name, c['calls'], c['seconds'],
+                                                      c['mean'] * 1000))
+        lines.append('')
+        if self.mode == 'cpu':
+            lines.append('%8s %10s %10s  %s' % ('ncalls', 'tottime', 'cumtime', 'function'))
+            for e in report['top']:
+                lines.append('%8d %10.3f %10.3f  %s' % (e['calls'], e['tottime'],
+                                                        e['cumtime'], e['function']))
+        else:
+            lines.append('peak traced memory: %.1f KiB' % (report['peak'] / 1024.))
+            lines.append('%12s %8s  %s' % ('KiB', 'blocks', 'line'))
+            for e in report['top']:
+                lines.append('%12.1f %8d  %s' % (e['bytes'] / 1024., e['blocks'], e['line']))
+        return '\n'.join(lines)
+
+    def json(self, limit=30, sort='cumulative'):
+        return json.dumps(self.report(limit, sort), indent=2)
+
+    def pstats(self, sort='cumulative', limit=30):
+        """
+        the standard pstats listing of the cpu profile
+        """
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+@contextlib.contextmanager
+def profiling(targets=(), mode='cpu', frames=1):
+    """
+    profiles the public methods of targets while the block runs:
+
+        with profiling([Player, snapshots], mode='memory') as profiler:
+            features.build(season='2015-2016')
+        print(profiler.text())
+    """
+    profiler = Profiler(mode, frames)
+    for target in targets:
+        profiler.patch(target)
+    try:
+        yield profiler
+    finally:
+        profiler.restore()
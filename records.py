@@ -0,0 +1,184 @@
+import numpy as np
+from sqlalchemy import Integer, func, select
+
+from . import Session
+from .fastload import as_float, stat_columns
+from .overview import Match
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+# box score counts fit in int16, null is stored as MISSING
+MISSING = np.iinfo(np.int16).min
+
+
+def _keys(model):
+    if model is PlayerMatchStats:
+        return ['id', 'player_id', 'match_id', 'team_id']
+    return ['id', 'team_id', 'match_id']
+
+
+def dtype(model, columns=None):
+    """
+    structured dtype of one box score of model: int32 keys, the match date, int16
+    counts and float32 rates
+    """
+    table = model.__table__
+    columns = list(columns or stat_columns(model))
+    fields = [(k, np.int32) for k in _keys(model)] + [('date', 'datetime64[D]')]
+    for c in columns:
+        fields.append((c, np.int16 if isinstance(table.c[c].type, Integer) else np.float32))
+    return np.dtype(fields)
+
+
+def _dates(instances, chunk_size=10000):
+    """
+    match date of each box score instance, from its match when loaded and from
+    one query per chunk of match ids otherwise
+    """
+    matches = [i.__dict__.get('match') for i in instances]
+    ids = list(set(i.match_id for i, m in zip(instances, matches) if m is None))
+    dates = {}
+    for n in range(0, len(ids), chunk_size):
+        dates.update(Session.query(Match.id, Match.date).filter(
+                     Match.id.in_(ids[n:n + chunk_size])).all())
+    return [dates[i.match_id] if m is None else m.date for i, m in zip(instances, matches)]
+
+
+class Records(object):
+    """
+    box scores of teams or players packed one fixed size record per row in a numpy
+    structured array, a small fraction of the memory of ORM instances. rows are
+    sorted by (entity, date)
+    """
+
+    def __init__(self, model, array):
+        self.model = model
+        self.key = _keys(model)[1]
+        self.columns = [n for n in array.dtype.names if n not in _keys(model) + ['date']]
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, n):
+        return Records(self.model, self.array[n]) if not isinstance(n, (int, np.integer)) \
+            else self.array[n]
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def _sort(self):
+        self.array = self.array[np.lexsort((self.array['date'], self.array[self.key]))]
+        return self
+
+    def column(self, name):
+        """
+        column as float64 with nan for nulls
+        """
+        values = self.array[name]
+        if values.dtype == np.int16:
+            return np.where(values == MISSING, np.nan, values.astype(float))
+        return values.astype(float)
+
+    def entity(self, entity_id):
+        """
+        records of a single team or player
+        """
+        ids = self.array[self.key]
+        lo, hi = np.searchsorted(ids, entity_id, 'left'), np.searchsorted(ids, entity_id, 'right')
+        return Records(self.model, self.array[lo:hi])
+
+    @classmethod
+    def empty(cls, model, count, columns=None):
+        return cls(model, np.zeros(count, dtype=dtype(model, columns)))
+
+    def _fill(self, start, cols):
+        """
+        copies a block of columns, keys first then date then stats, into rows
+        starting at start
+        """
+        end = start + len(cols[0])
+        for name, values in zip(self.array.dtype.names, cols):
+            field = self.array.dtype[name]
+            if field == np.int16:
+                values = np.array(values, dtype=float)
+                values = np.where(np.isnan(values), MISSING, np.round(values))
+            elif field.kind == 'M':
+                values = np.array(values, dtype='datetime64[D]')
+            else:
+                values = np.array([np.nan if v is None else v for v in values], dtype=float) \
+                    if field.kind == 'f' else np.array(values)
+            self.array[name][start:end] = values
+        return end
+
+    @classmethod
+    def load(cls, model, columns=None, where=None, chunk_size=10000):
+        """
+        box scores of model streamed from the database straight into records,
+        without building ORM instances
+        """
+        table = model.__table__
+        columns = list(columns or stat_columns(model))
+        statement = select(*[table.c[k] for k in _keys(model)] + [Match.date] +
+                           [as_float(table.c[c]) for c in columns]
+                    ).select_from(table.join(Match.__table__, table.c.match_id == Match.id))
+        if where is not None:
+            statement = statement.where(where)
+        connection = Session.connection()
+        count = connection.execute(select(func.count()).select_from(
+                    statement.subquery())).scalar()
+        records = cls.empty(model, count, columns)
+        result = connection.execution_options(stream_results=True).execute(statement)
+        pos = 0
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            pos = records._fill(pos, list(zip(*rows)))
+        records.array = records.array[:pos]
+        return records._sort()
+
+    @classmethod
+    def from_orm(cls, instances, columns=None):
+        """
+        records of a list of TeamMatchStats or PlayerMatchStats instances
+        """
+        if not instances:
+            return cls.empty(PlayerMatchStats, 0, columns)
+        model = type(instances[0])
+        records = cls.empty(model, len(instances), columns)
+        names = _keys(model) + ['date'] + records.columns
+        dates = _dates(instances)
+        records._fill(0, [dates if n == 'date' else [getattr(i, n) for i in instances]
+                          for n in names])
+        return records._sort()
+
+    def to_orm(self):
+        """
+        transient model instances of the records, ready to be added to a session
+        """
+        names = [n for n in _keys(self.model) if n != 'id'] + self.columns
+        integer = set(n for n in self.columns if self.array.dtype[n] == np.int16)
+        rv = []
+        for row in self.array.tolist():
+            values = dict(zip(self.array.dtype.names, row))
+            kwargs = {'id': values['id'] or None}
+            for n in names:
+                v = values[n]
+                if n in integer:
+                    v = None if v == MISSING else v
+                elif isinstance(v, float):
+                    # float32 holds 7 significant digits, drop the binary noise
+                    v = None if v != v else float('%.7g' % v)
+                kwargs[n] = v
+            rv.append(self.model(**kwargs))
+        return rv
+
+
+def load(kind='players', columns=None, where=None):
+    """
+    records of every player or team box score in the database
+    """
+    model = PlayerMatchStats if kind == 'players' else TeamMatchStats
+    return Records.load(model, columns, where)
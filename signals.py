@@ -0,0 +1,72 @@
+from collections import namedtuple
+from sqlalchemy import event
+
+from . import Session
+from .overview import Match, League
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+Ingested = namedtuple('Ingested', ['kind', 'entity_id', 'team_id', 'match_id', 'league_id',
+                                   'season', 'date', 'type', 'home'])
+
+_subscribers = []
+
+
+def subscribe(callback):
+    """
+    callback(records) is called with the Ingested records of every commit that
+    adds box scores through the ORM
+    """
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def notify(records):
+    """
+    for writers that bypass the ORM (bulk and Core inserts)
+    """
+    for callback in list(_subscribers):
+        callback(records)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, context):
+    pending = session.info.setdefault('ingested_boxes', [])
+    for obj in session.new:
+        if isinstance(obj, PlayerMatchStats):
+            pending.append(('players', obj.player_id, obj.team_id, obj.match_id))
+        elif isinstance(obj, TeamMatchStats):
+            pending.append(('teams', obj.team_id, obj.team_id, obj.match_id))
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _resolve(session, context):
+    pending = session.info.pop('ingested_boxes', [])
+    if not pending or not _subscribers:
+        return
+    matches = dict((m[0], m[1:]) for m in session.query(Match.id, Match.league_id,
+                    League.season, Match.date, Match.type, Match.home_id
+                ).join(Match.league).filter(Match.id.in_(set(p[3] for p in pending))))
+    records = session.info.setdefault('ingested', [])
+    for kind, entity_id, team_id, match_id in pending:
+        league_id, season, date, type_, home_id = matches[match_id]
+        records.append(Ingested(kind, entity_id, team_id, match_id, league_id, season, date,
+                                type_, team_id == home_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch(session):
+    records = session.info.pop('ingested', [])
+    if records:
+        notify(records)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    session.info.pop('ingested_boxes', None)
+    session.info.pop('ingested', None)
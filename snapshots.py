@@ -0,0 +1,428 @@
+import time
+import datetime
+import numpy as np
+from sqlalchemy import Integer, func, and_
+from sqlalchemy.orm import aliased
+
+from . import Session, metrics, parallel
+from .cache import get_cache
+from .travel import Distances, Travel, last_city, schedule, trailing
+from .streaks import extend, parse_result, parse_results, streaks
+from .overview import Match, League
+from .stats import TeamMatchStats, PlayerMatchStats, TeamSeasonStats, TeamSeasonHomeStats, \
+                  TeamSeasonAwayStats, PlayerSeasonStats, PlayerSeasonHomeStats, \
+                  PlayerSeasonAwayStats, COUNTING_STATS, CRITICAL_STATS, RAW_STATS
+
+
+TABLES = {
+    'teams': {'all': TeamSeasonStats, 'home': TeamSeasonHomeStats,
+              'away': TeamSeasonAwayStats},
+    'players': {'all': PlayerSeasonStats, 'home': PlayerSeasonHomeStats,
+                'away': PlayerSeasonAwayStats},
+}
+LOCS = ('all', 'home', 'away')
+KEYS = {'teams': 'team_id', 'players': 'player_id'}
+BOX_SCORES = {'teams': TeamMatchStats, 'players': PlayerMatchStats}
+
+
+def metric_names(metrics):
+    if metrics == 'critical':
+        return list(CRITICAL_STATS)
+    elif metrics == 'raw':
+        return list(RAW_STATS)
+    return list(metrics)
+
+
+def _latest(table, key, ids, columns, date, strict=False, type_=None, season=None,
+                league_id=None):
+    """
+    query of the latest snapshot per id on or before date (strictly before if strict)
+    """
+    conditions = [key.in_(ids), table.date < date if strict else table.date <= date]
+    if type_:
+        conditions.append(table.type == type_)
+    if season is not None:
+        conditions.append(League.season == season)
+    if league_id is not None:
+        conditions.append(table.league_id == league_id)
+
+    latest = Session.query(key.label('entity_id'), func.max(table.date).label('date')
+                ).join(table.league).filter(*conditions).group_by(key).subquery()
+    return Session.query(key, table.date, *[getattr(table, c) for c in columns]
+            ).join(table.league).join(latest, and_(key == latest.c.entity_id,
+                                                   table.date == latest.c.date)
+            ).filter(*conditions)
+
+
+def bulk_season_stats(kind, ids, season, date, metrics='critical', loc='all', type_=None,
+                        as_dict=False):
+    """
+    latest snapshot on or before date for every id, as a matrix with one row per id
+    in the given order and one column per metric (nan where there is no snapshot)
+    """
+    table = TABLES[kind][loc]
+    metrics = metric_names(metrics)
+    ids = list(ids)
+    if kind != 'teams':
+        type_ = None
+    rows = _latest(table, getattr(table, KEYS[kind]), ids, metrics, date, type_=type_,
+                   season=season)
+
+    pos = dict((entity_id, n) for n, entity_id in enumerate(ids))
+    matrix = np.full((len(ids), len(metrics)), np.nan)
+    for row in rows:
+        matrix[pos[row[0]]] = [np.nan if v is None else float(v) for v in row[2:]]
+
+    if as_dict:
+        return dict((m, matrix[:, n]) for n, m in enumerate(metrics))
+    return matrix
+
+
+def season_rates(kind, totals):
+    """
+    derived columns of a (rows, 3 * counting stats) matrix of own, team and opponent
+    running totals
+    """
+    n = len(COUNTING_STATS)
+    own, team, opp = totals[:, :n], totals[:, n:2 * n], totals[:, 2 * n:]
+    if kind == 'teams':
+        return metrics.compute(metrics.frame(own), opp=metrics.frame(opp))
+    return metrics.compute(metrics.frame(own), metrics.frame(team), metrics.frame(opp))
+
+
+def snapshot_row(kind, table, entity_id, team_id, league_id, date, type_, totals, derived):
+    row = {'team_id': team_id, 'league_id': league_id, 'date': date}
+    if kind == 'teams':
+        row['type'] = type_
+    else:
+        row['player_id'] = entity_id
+    columns = table.__table__.c
+    for name, value in zip(COUNTING_STATS, totals):
+        row[name] = int(round(value)) if isinstance(columns[name].type, Integer) \
+                        else float(value)
+    for name, value in derived.items():
+        if name in columns and name not in row:
+            if value is None or np.isnan(value):
+                row[name] = None
+            elif isinstance(columns[name].type, Integer):
+                row[name] = int(value)
+            else:
+                row[name] = float(value)
+    return row
+
+
+def _counting(box):
+    if box is None:
+        return np.zeros(len(COUNTING_STATS))
+    return np.array([float(getattr(box, c) or 0) for c in COUNTING_STATS])
+
+
+def _in_split(loc, home):
+    return loc == 'all' or (loc == 'home') == home
+
+
+def _context(kind, ids, match, loc):
+    """
+    team and opponent counting totals of ids over their matches in the league
+    before match, as one aggregate query
+    """
+    if kind == 'teams':
+        own = aliased(TeamMatchStats)
+        entity, team = own.team_id, own
+    else:
+        own = PlayerMatchStats
+        entity, team = own.player_id, aliased(TeamMatchStats)
+    opp = aliased(TeamMatchStats)
+    query = Session.query(entity, *([func.sum(getattr(team, c)) for c in COUNTING_STATS] +
+                                    [func.sum(getattr(opp, c)) for c in COUNTING_STATS]))
+    if kind == 'players':
+        query = query.join(team, and_(team.match_id == own.match_id,
+                                      team.team_id == own.team_id))
+    query = query.join(opp, and_(opp.match_id == own.match_id, opp.team_id != own.team_id)
+                ).join(Match, Match.id == own.match_id).filter(entity.in_(ids)
+                ).filter(Match.league_id == match.league_id).filter(Match.date < match.date)
+    if kind == 'teams':
+        query = query.filter(Match.type == match.type)
+    if loc == 'home':
+        query = query.filter(own.team_id == Match.home_id)
+    elif loc == 'away':
+        query = query.filter(own.team_id == Match.away_id)
+    return query.group_by(entity)
+
+
+class SnapshotBuilder(object):
+    """
+    derives the snapshot rows of a newly ingested match from the previous snapshot
+    of each team and player in it plus running counting-stat totals, so the cost of
+    a match is proportional to the box scores in it. matches are expected in date order
+    """
+
+    def __init__(self, loc='all'):
+        self.loc = loc
+        self.totals = {}
+        self.schedules = {}
+        self.distances = None
+
+    def travel(self, match):
+        """
+        DIST_7 and MATCHES_PLAYED_7 of both teams of match, keeping in memory only
+        each team's matches of the league over the trailing 7 days and the city
+        of its last one
+        """
+        if self.distances is None:
+            self.distances = Distances.load()
+        teams = (match.home_id, match.away_id)
+        missing = [t for t in teams if (match.league_id, t) not in self.schedules]
+        if missing:
+            since = match.date - datetime.timedelta(6)
+            past = schedule(match.league_id, missing, before=match.date, since=since)
+            for t in missing:
+                window = self.schedules[(match.league_id, t)] = \
+                    list(last_city(match.league_id, t, since)) + [[]]
+                rows = past[0] == t
+                for match_id, day, city in zip(*[c[rows].tolist() for c in past[1:]]):
+                    self._travelled(window, match_id, day, city)
+        city = match.city_id or (match.stadium.city_id if match.stadium else None)
+        day = int(np.datetime64(match.date, 'D').astype(np.int64))
+        return dict((t, self._travelled(self.schedules[(match.league_id, t)], match.id,
+                                        day, city)) for t in teams)
+
+    def _travelled(self, window, match_id, day, city):
+        """
+        travel of a team's match played after those of window, a [seen, last city,
+        matches] list whose matches are (match id, day, leg, travel) of the last 7 days
+        """
+        seen, last, matches = window
+        for m in matches:
+            if m[0] == match_id:
+                return m[3]
+        leg = float(self.distances.between([last], [city])[0]) if seen else 0.
+        matches[:] = [m for m in matches if m[1] > day - 7]
+        matches.append((match_id, day, leg, None))
+        rv = {'DIST_7': sum(m[2] for m in matches), 'MATCHES_PLAYED_7': float(len(matches))}
+        matches[-1] = matches[-1][:3] + (rv,)
+        window[:2] = [True, city]
+        return rv
+
+    def played(self, match, ids):
+        """
+        matches each player played in the league over the 7 days up to match
+        """
+        since = match.date - datetime.timedelta(6)
+        rows = Session.query(PlayerMatchStats.player_id, func.count(PlayerMatchStats.id)
+                ).join(PlayerMatchStats.match).filter(PlayerMatchStats.player_id.in_(ids)
+                ).filter(Match.league_id == match.league_id).filter(Match.date < match.date
+                ).filter(Match.date >= since).group_by(PlayerMatchStats.player_id)
+        played = dict(rows.all())
+        return dict((i, played.get(i, 0) + 1) for i in ids)
+
+    def previous(self, kind, match, ids):
+        """
+        own, team and opponent totals before match for each id
+        """
+        n = len(COUNTING_STATS)
+        type_ = match.type if kind == 'teams' else None
+        keys = dict((i, (kind, i, match.league_id, type_)) for i in ids)
+        missing = [i for i in ids if keys[i] not in self.totals
+                   or self.totals[keys[i]][0] >= match.date]
+        if missing:
+            totals = dict((i, np.zeros(3 * n)) for i in missing)
+            streak = dict((i, 0) for i in missing)
+            table = TABLES[kind][self.loc]
+            for row in _latest(table, getattr(table, KEYS[kind]), missing,
+                               COUNTING_STATS + ['STREAK'], match.date, strict=True,
+                               type_=type_, league_id=match.league_id):
+                totals[row[0]][:n] = [float(v or 0) for v in row[2:-1]]
+                streak[row[0]] = row[-1] or 0
+            for row in _context(kind, missing, match, self.loc):
+                totals[row[0]][n:] = [float(v or 0) for v in row[1:]]
+            for i in missing:
+                self.totals[keys[i]] = (datetime.date.min, totals[i], streak[i])
+        return dict((i, self.totals[keys[i]][1:]) for i in ids)
+
+    def ingest(self, match):
+        """
+        snapshot rows produced by match keyed by kind
+        """
+        rows = {'teams': [], 'players': []}
+        teams = dict((b.team_id, b) for b in match.teams_stats)
+        trips = self.travel(match)
+        outcome = parse_result(match.result)
+        for kind, boxes in (('teams', match.teams_stats), ('players', match.players_stats)):
+            key = KEYS[kind]
+            boxes = [b for b in boxes if _in_split(self.loc, b.team_id == match.home_id)]
+            if not boxes:
+                continue
+            previous = self.previous(kind, match, [getattr(b, key) for b in boxes])
+            type_ = match.type if kind == 'teams' else None
+            totals, streak = [], []
+            for box in boxes:
+                home = box.team_id == match.home_id
+                opp_id = match.away_id if home else match.home_id
+                current = np.concatenate([_counting(box), _counting(teams.get(box.team_id)),
+                                          _counting(teams.get(opp_id))])
+                before, before_streak = previous[getattr(box, key)]
+                totals.append(before + current)
+                streak.append(extend(before_streak, outcome if home else -outcome))
+                self.totals[(kind, getattr(box, key), match.league_id, type_)] = \
+                    (match.date, totals[-1], streak[-1])
+            totals = np.array(totals)
+            rates = season_rates(kind, totals)
+            table = TABLES[kind][self.loc]
+            if kind == 'players':
+                played = self.played(match, [b.player_id for b in boxes])
+            for n, box in enumerate(boxes):
+                derived = dict((c, v[n]) for c, v in rates.items())
+                derived.update(trips[box.team_id])
+                derived['STREAK'] = streak[n]
+                if kind == 'players':
+                    derived['MATCHES_PLAYED_7'] = played[box.player_id]
+                rows[kind].append(snapshot_row(kind, table, getattr(box, key), box.team_id,
+                                  match.league_id, match.date, type_,
+                                  totals[n, :len(COUNTING_STATS)], derived))
+        return rows
+
+    def add(self, match):
+        """
+        ingests match and writes its snapshot rows, dropping the cached lookups of
+        the teams and players written
+        """
+        rows = self.ingest(match)
+        cache = get_cache()
+        for kind in rows:
+            table = TABLES[kind][self.loc]
+            key = getattr(table, KEYS[kind])
+            ids = [r[KEYS[kind]] for r in rows[kind]]
+            if ids:
+                Session.query(table).filter(table.date == match.date).filter(key.in_(ids)
+                        ).delete(synchronize_session=False)
+            Session.bulk_insert_mappings(table, rows[kind])
+            if cache is not None:
+                for entity_id in set(ids):
+                    cache.invalidate(kind, entity_id, match.league.season)
+        return rows
+
+
+def _cumulative(groups, values):
+    """
+    running totals of values within runs of equal consecutive groups
+    """
+    totals = np.cumsum(values, axis=0)
+    starts = np.r_[True, groups[1:] != groups[:-1]]
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(groups)), 0))
+    return totals - (totals - values)[first]
+
+
+def _match_log(kind, league_id):
+    box = BOX_SCORES[kind]
+    return Session.query(getattr(box, KEYS[kind]), box.team_id, Match.date, Match.type,
+                Match.home_id, box.match_id, Match.result,
+                *[getattr(box, c) for c in COUNTING_STATS]
+            ).join(box.match).filter(Match.league_id == league_id).all()
+
+
+def _take(values, pos):
+    rv = values[np.maximum(pos, 0)]
+    rv[pos < 0] = 0
+    return rv
+
+
+def rebuild(league_id, write=True):
+    """
+    recomputes every all, home and away snapshot of league from a single pass over
+    its match log, the reference the incremental builder is checked against
+    """
+    rows = dict((kind, dict((loc, []) for loc in LOCS)) for kind in TABLES)
+    logs = dict((kind, _match_log(kind, league_id)) for kind in TABLES)
+    n = len(COUNTING_STATS)
+    team_values = np.array([[float(v or 0) for v in r[7:]] for r in logs['teams']]
+                           ).reshape(len(logs['teams']), n)
+    team_matches = [r[5] for r in logs['teams']]
+    team_teams = [r[1] for r in logs['teams']]
+    trips = Travel.load(league_id).table()
+    for kind, log in logs.items():
+        if not log:
+            continue
+        entity = np.array([r[0] for r in log])
+        dates = np.array([r[2] for r in log], dtype='datetime64[D]')
+        types = np.array([(r[3] or '') if kind == 'teams' else '' for r in log])
+        home = np.array([r[1] == r[4] for r in log])
+        outcomes = parse_results([r[6] for r in log]) * np.where(home, 1, -1)
+        values = np.array([[float(v or 0) for v in r[7:]] for r in log])
+        own, opp = metrics.pair([r[5] for r in log], [r[1] for r in log],
+                                team_matches, team_teams)
+        values = np.hstack([values, _take(team_values, own), _take(team_values, opp)])
+
+        codes, types = np.unique(types, return_inverse=True)
+        groups = entity * len(codes) + types
+        order = np.lexsort((dates, groups))
+        extra = [trips.get((r[1], r[5]), (None, None)) for r in log]
+        if kind == 'players':
+            played = np.empty(len(log))
+            played[order] = trailing(entity[order], dates[order].astype(np.int64),
+                                     np.ones(len(log)))
+            extra = [(e[0], p) for e, p in zip(extra, played)]
+        for loc in LOCS:
+            split = order if loc == 'all' else order[home[order] == (loc == 'home')]
+            totals = _cumulative(groups[split], values[split])
+            rates = season_rates(kind, totals)
+            rates['STREAK'] = streaks(groups[split], outcomes[split])
+            table = TABLES[kind][loc]
+            for k, i in enumerate(split):
+                r = log[i]
+                derived = dict((c, v[k]) for c, v in rates.items())
+                derived['DIST_7'], derived['MATCHES_PLAYED_7'] = extra[i]
+                rows[kind][loc].append(snapshot_row(kind, table, r[0], r[1], league_id, r[2],
+                                       r[3] if kind == 'teams' else None, totals[k, :n],
+                                       derived))
+
+    if write:
+        replace(league_id, rows)
+    return rows
+
+
+def replace(league_id, rows):
+    """
+    swaps the snapshots of league for rows, as returned by rebuild
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate_season(Session.query(League.season).filter(League.id == league_id
+                                                                    ).scalar())
+    for kind in rows:
+        for loc in LOCS:
+            table = TABLES[kind][loc]
+            Session.query(table).filter(table.league_id == league_id
+                    ).delete(synchronize_session=False)
+            if rows[kind][loc]:
+                Session.execute(table.__table__.insert(), rows[kind][loc])
+
+
+def _compute(league_id):
+    return rebuild(league_id, write=False)
+
+
+def rebuild_all(league_ids=None, processes=None, progress=True):
+    """
+    rebuilds the snapshots of every league, or of league_ids, computing leagues
+    in a pool of worker processes while this one writes and commits each league
+    as it arrives. returns the rows and seconds of every league
+    """
+    if league_ids is None:
+        league_ids = [r[0] for r in Session.query(League.id).order_by(League.id)]
+    start = time.perf_counter()
+    report = []
+    for league_id, rows, seconds in parallel.imap(_compute, league_ids, processes):
+        written = time.perf_counter()
+        replace(league_id, rows)
+        Session.commit()
+        report.append({'league_id': league_id, 'seconds': seconds,
+                       'write': time.perf_counter() - written,
+                       'rows': sum(len(r) for locs in rows.values() for r in locs.values())})
+        if progress:
+            print('[%d/%d] league %d: %d rows, computed in %.2fs, written in %.2fs'
+                  % (len(report), len(league_ids), league_id, report[-1]['rows'], seconds,
+                     report[-1]['write']))
+    if progress:
+        print('%d leagues in %.2fs' % (len(report), time.perf_counter() - start))
+    return report
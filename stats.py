@@ -5,6 +5,19 @@ from sqlalchemy.orm import relationship
 from . import Base
 
 
+COUNTING_STATS = ['MP', 'OPOS', 'DPOS', 'FG', 'FGA', 'PTS', 'TWO', 'TWOA', 'THR', 'THRA',
+                  'FT', 'FTA', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF',
+                  'PLUS_MINUS']
+RATE_STATS = ['FGP', 'TWOP', 'TWOAr', 'THRP', 'THRAr', 'FTP', 'FTAr', 'FT_to_FGA', 'EFGP',
+              'TSA', 'TSP', 'FIC', 'PACE', 'ORBr', 'DRBr', 'AST_to_TOV', 'STL_to_TOV',
+              'ORBP', 'DRBP', 'TRBP', 'ASTP', 'STLP', 'BLKP', 'TOVP', 'USGP', 'ORtg',
+              'AORtg', 'DRtg', 'ADRtg']
+TEAM_STATS = COUNTING_STATS + RATE_STATS
+PLAYER_STATS = COUNTING_STATS + RATE_STATS + ['HOB']
+CRITICAL_STATS = ['EFGP', 'TOVP', 'ORBP', 'FT_to_FGA', 'DRBP']
+RAW_STATS = COUNTING_STATS
+
+
 class TeamMatchStats(Base):
     __tablename__ = 'teams_stats'
 
@@ -69,7 +82,7 @@ class TeamMatchStats(Base):
 
     PLUS_MINUS = Column(Integer, nullable=True)
 
-    UniqueConstraint(match_id, team_id)
+    __table_args__ = (UniqueConstraint('match_id', 'team_id'),)
 
     def __repr__(self):
         return '{date: %s, league: %s, team: %s}' \
@@ -143,7 +156,7 @@ class PlayerMatchStats(Base):
 
     PLUS_MINUS = Column(Integer, nullable=True)
 
-    UniqueConstraint(player_id, match_id)
+    __table_args__ = (UniqueConstraint('player_id', 'match_id'),)
 
     def __repr__(self):
         return '{date: %s, league: %s, team: %s, player: %s}' \
@@ -221,7 +234,7 @@ class TeamSeasonStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(team_id, date, type)
+    __table_args__ = (UniqueConstraint('team_id', 'date', 'type'),)
 
 
 class TeamSeasonHomeStats(Base):
@@ -294,7 +307,7 @@ class TeamSeasonHomeStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(team_id, date, type)
+    __table_args__ = (UniqueConstraint('team_id', 'date', 'type'),)
 
 
 class TeamSeasonAwayStats(Base):
@@ -367,7 +380,7 @@ class TeamSeasonAwayStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(team_id, date, type)
+    __table_args__ = (UniqueConstraint('team_id', 'date', 'type'),)
 
 class PlayerSeasonStats(Base):
     __tablename__ = 'players_seasons_stats'
@@ -441,7 +454,7 @@ class PlayerSeasonStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(player_id, date)
+    __table_args__ = (UniqueConstraint('player_id', 'date'),)
 
 
 class PlayerSeasonHomeStats(Base):
@@ -516,7 +529,7 @@ class PlayerSeasonHomeStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(player_id, date)
+    __table_args__ = (UniqueConstraint('player_id', 'date'),)
 
 
 class PlayerSeasonAwayStats(Base):
@@ -591,7 +604,7 @@ class PlayerSeasonAwayStats(Base):
     DIST_7 = Column(Numeric, nullable=True)
     MATCHES_PLAYED_7 = Column(Numeric, nullable=True)
 
-    UniqueConstraint(player_id, date)
+    __table_args__ = (UniqueConstraint('player_id', 'date'),)
 
 
 class Score(Base):
@@ -0,0 +1,273 @@
+import numpy as np
+
+from . import Session
+from .fastload import as_float
+from .form import FormEngine
+from .index import Indexes, MatchIndex, use_index
+from .workload import Workload
+from .overview import Match, League
+from .snapshots import season_rates
+from .stats import TeamMatchStats, PlayerMatchStats, TEAM_STATS, PLAYER_STATS, COUNTING_STATS
+
+
+def _keys(entity, date):
+    return np.asarray(entity, dtype=np.int64) * (1 << 32) + \
+        np.asarray(date, dtype='datetime64[D]').astype(np.int64)
+
+
+class MatchLog(object):
+    """
+    box scores of players or teams held as numpy columns sorted by (entity, date)
+    """
+    fields = ('id', 'entity', 'match_id', 'team_id', 'league_id', 'season', 'date',
+              'type', 'home', 'opponent')
+
+    def __init__(self, model, key, columns):
+        self.model = model
+        self.key = key
+        self.columns = list(columns)
+        self.col = dict((c, i) for i, c in enumerate(self.columns))
+        self.id = np.empty(0, dtype=np.int64)
+        self.entity = np.empty(0, dtype=np.int64)
+        self.match_id = np.empty(0, dtype=np.int64)
+        self.team_id = np.empty(0, dtype=np.int64)
+        self.league_id = np.empty(0, dtype=np.int64)
+        self.season = np.empty(0, dtype=object)
+        self.date = np.empty(0, dtype='datetime64[D]')
+        self.type = np.empty(0, dtype=object)
+        self.home = np.empty(0, dtype=bool)
+        self.opponent = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, len(self.columns)))
+        self.keys = np.empty(0, dtype=np.int64)
+        self.slices = {}
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def watermark(self):
+        return int(self.id.max()) if len(self.id) else 0
+
+    def query(self, since=0):
+        """
+        box scores joined to their match and league, newer than row id since
+        """
+        model = self.model
+        return Session.query(model.id, getattr(model, self.key), model.match_id,
+                    model.team_id, Match.league_id, League.season, Match.date, Match.type,
+                    Match.home_id, Match.away_id,
+                    *[as_float(getattr(model, c)) for c in self.columns]
+                ).join(model.match).join(Match.league).filter(model.id > since)
+
+    def extend(self, rows):
+        """
+        merges query rows into the columns keeping them sorted: the new rows are
+        sorted on their own and inserted at their positions, the existing ones are
+        only shifted
+        """
+        if not rows:
+            return 0
+        cols = list(zip(*rows))
+        team_id, home_id, away_id = (np.array(cols[n], dtype=np.int64) for n in (3, 8, 9))
+        new = {
+            'id': np.array(cols[0], dtype=np.int64),
+            'entity': np.array(cols[1], dtype=np.int64),
+            'match_id': np.array(cols[2], dtype=np.int64),
+            'team_id': team_id,
+            'league_id': np.array(cols[4], dtype=np.int64),
+            'season': np.array(cols[5], dtype=object),
+            'date': np.array(cols[6], dtype='datetime64[D]'),
+            'type': np.array(cols[7], dtype=object),
+            'home': team_id == home_id,
+            'opponent': np.where(team_id == home_id, away_id, home_id),
+        }
+        values = np.array([row[10:] for row in rows], dtype=float
+                          ).reshape(len(rows), len(self.columns))
+        self.merge(new, values)
+        return len(rows)
+
+    def merge(self, new, values):
+        """
+        inserts new columns, keyed by field, and their values at their positions
+        """
+        order = np.lexsort((new['date'], new['entity']))
+        keys = _keys(new['entity'], new['date'])[order]
+        # new rows go after existing ones with the same key, as a stable sort would
+        at = np.searchsorted(self.keys, keys, side='right')
+        for name in self.fields:
+            setattr(self, name, np.insert(getattr(self, name), at, new[name][order]))
+        self.values = np.insert(self.values, at, values[order], axis=0)
+        self.reindex()
+
+    def sort(self):
+        """
+        orders the columns by (entity, date) and indexes each entity's slice
+        """
+        order = np.lexsort((self.date, self.entity))
+        for name in self.fields:
+            setattr(self, name, getattr(self, name)[order])
+        self.values = self.values[order]
+        self.reindex()
+
+    def reindex(self, keys=None):
+        """
+        search keys (computed unless given) and entity slices of columns already
+        sorted by (entity, date)
+        """
+        self.keys = _keys(self.entity, self.date) if keys is None else keys
+        starts = np.flatnonzero(np.r_[True, self.entity[1:] != self.entity[:-1]]) \
+            if len(self.entity) else np.empty(0, dtype=int)
+        ends = np.r_[starts[1:], len(self.entity)]
+        self.slices = dict(zip(self.entity[starts].tolist(),
+                               zip(starts.tolist(), ends.tolist())))
+
+    def rows(self, entity_id, season=None, date=None, loc='all', type_='all',
+                inclusive=True):
+        """
+        positions of the entity's box scores in season up to date
+        """
+        start, end = self.slices.get(entity_id, (0, 0))
+        if date is not None:
+            side = 'right' if inclusive else 'left'
+            end = start + int(np.searchsorted(self.date[start:end],
+                                              np.datetime64(date, 'D'), side=side))
+        mask = np.ones(end - start, dtype=bool)
+        if season is not None:
+            mask &= self.season[start:end] == season
+        if loc == 'home':
+            mask &= self.home[start:end]
+        elif loc == 'away':
+            mask &= ~self.home[start:end]
+        if type_ != 'all':
+            mask &= self.type[start:end] == type_
+        return np.arange(start, end)[mask]
+
+
+class StatsStore(object):
+    """
+    match log loaded once from players_stats and teams_stats, answering the
+    Player lookups without a round-trip per call
+    """
+
+    def __init__(self):
+        self.players = MatchLog(PlayerMatchStats, 'player_id', PLAYER_STATS)
+        self.teams = MatchLog(TeamMatchStats, 'team_id', TEAM_STATS)
+        self.forms = {}
+        self.workloads = {}
+        self.index = Indexes(MatchIndex(), MatchIndex())
+
+    def refresh(self):
+        """
+        loads box scores ingested since the last refresh, returns rows added. the
+        new rows are merged into the logs and added to the indexes, which are
+        only built from scratch on the first load
+        """
+        added = 0
+        for kind in ('teams', 'players'):
+            log = getattr(self, kind)
+            first = not len(log)
+            rows = log.query(log.watermark).all()
+            log.extend(rows)
+            if first and rows:
+                setattr(self.index, kind, MatchIndex.build(log.entity, log.season, log.date,
+                                                           log.match_id, log.type))
+            else:
+                index = getattr(self.index, kind)
+                for r in rows:
+                    index.add(r[1], r[5], r[6], r[2], r[7])
+            added += len(rows)
+        if added:
+            self.forms = {}
+            self.workloads = {}
+        return added
+
+    def form_engine(self, kind):
+        if kind not in self.forms:
+            self.forms[kind] = FormEngine(getattr(self, kind))
+        return self.forms[kind]
+
+    def workload(self, kind):
+        if kind not in self.workloads:
+            self.workloads[kind] = Workload(getattr(self, kind))
+        return self.workloads[kind]
+
+    def _team_totals(self, team_id, date, match_id):
+        """
+        counting stats of the team box scores of (team_id, match_id) rows summed,
+        missing box scores counting as zeros
+        """
+        log = self.teams
+        keys = _keys(team_id, date)
+        lo = np.searchsorted(log.keys, keys, side='left')
+        hi = np.searchsorted(log.keys, keys, side='right')
+        pos = lo.copy()
+        # a team plays once a day, further matches of the day are told apart by id
+        for n in np.flatnonzero(hi - lo > 1):
+            hits = np.flatnonzero(log.match_id[lo[n]:hi[n]] == match_id[n])
+            pos[n] = lo[n] + hits[0] if len(hits) else hi[n]
+        found = pos < hi
+        cols = [log.col[c] for c in COUNTING_STATS]
+        values = np.nan_to_num(log.values[pos[found]][:, cols])
+        return values[log.match_id[pos[found]] == match_id[found]].sum(axis=0)
+
+    def season_stats(self, kind, entity_id, season, date, metrics, loc='all', type_=None):
+        """
+        season snapshot of metrics as of date, as snapshots.rebuild writes it:
+        counting stats summed over the entity's matches of the league (and match
+        type, for teams) up to date, rates computed from those sums. nan where
+        the snapshot is null, None if a metric is not derived from box scores
+        (STREAK, DIST_7...)
+        """
+        log = getattr(self, kind)
+        idx = log.rows(entity_id, season, date, loc,
+                       type_ if kind == 'teams' and type_ else 'all')
+        if not len(idx):
+            return [np.nan] * len(metrics)
+        same = log.league_id[idx] == log.league_id[idx[-1]]
+        if kind == 'teams':
+            same &= log.type[idx] == log.type[idx[-1]]
+        idx = idx[same]
+        cols = [log.col[c] for c in COUNTING_STATS]
+        own = np.nan_to_num(log.values[idx][:, cols]).sum(axis=0)
+        team = self._team_totals(log.team_id[idx], log.date[idx], log.match_id[idx]) \
+            if kind == 'players' else own
+        opp = self._team_totals(log.opponent[idx], log.date[idx], log.match_id[idx])
+        values = dict(zip(COUNTING_STATS, own.tolist()))
+        for name, value in season_rates(kind, np.concatenate([own, team, opp])[None, :]
+                                        ).items():
+            values.setdefault(name, float(value[0]))
+        if any(m not in values for m in metrics):
+            return None
+        return [values[m] for m in metrics]
+
+    def mins_played(self, kind, entity_id, date, days=15):
+        """
+        minutes played per day in the days previous to date
+        """
+        return self.workload(kind).at(entity_id, date, days)[0] / days
+
+
+_store = None
+
+
+def use_store(store):
+    """
+    makes model lookups answer from store, None goes back to the database
+    """
+    global _store
+    _store = store
+    use_index(store.index if store is not None else None)
+
+
+def get_store():
+    return _store
+
+
+def load():
+    """
+    builds a store from the whole match log and makes it the active one
+    """
+    store = StatsStore()
+    store.refresh()
+    use_store(store)
+    return store
@@ -0,0 +1,91 @@
+import re
+import numpy as np
+
+from . import Session
+from .overview import Match
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+HOME_WIN, DRAW, AWAY_WIN = 1, 0, -1
+
+
+def parse_result(result):
+    """
+    HOME_WIN, AWAY_WIN or DRAW from a result string, either a score like 102-98
+    or a 1X2 / H-D-A code. unreadable results count as draws
+    """
+    result = (result or '').strip().upper()
+    if result in ('H', '1', 'HOME'):
+        return HOME_WIN
+    elif result in ('A', '2', 'AWAY'):
+        return AWAY_WIN
+    elif result in ('D', 'X', 'DRAW'):
+        return DRAW
+    score = re.match(r'^(\d+)\s*[-:]\s*(\d+)', result)
+    if not score:
+        return DRAW
+    home, away = int(score.group(1)), int(score.group(2))
+    return HOME_WIN if home > away else AWAY_WIN if away > home else DRAW
+
+
+def parse_results(results):
+    """
+    outcomes of an array of results, parsing each distinct string once
+    """
+    results = np.array([r or '' for r in results], dtype=object)
+    if not len(results):
+        return np.empty(0, dtype=int)
+    distinct, inverse = np.unique(results.astype(str), return_inverse=True)
+    return np.array([parse_result(r) for r in distinct], dtype=int)[inverse]
+
+
+def streaks(groups, outcomes):
+    """
+    run length of wins (positive) or losses (negative) ending on each row, for rows
+    sorted by group and date. a draw ends the run and scores 0
+    """
+    groups, outcomes = np.asarray(groups), np.sign(np.asarray(outcomes, dtype=int))
+    n = len(outcomes)
+    if not n:
+        return np.empty(0, dtype=int)
+    starts = np.r_[True, (groups[1:] != groups[:-1]) | (outcomes[1:] != outcomes[:-1])]
+    first = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    return (np.arange(n) - first + 1) * outcomes
+
+
+def extend(streak, outcome):
+    """
+    streak after one more match with outcome
+    """
+    outcome = int(np.sign(outcome))
+    if outcome and streak and (streak > 0) == (outcome > 0):
+        return streak + outcome
+    return outcome
+
+
+def load(kind, league_id=None):
+    """
+    STREAK of every team or player at each of its matches, by league, as columns
+    ready for bulk writing
+    """
+    box = TeamMatchStats if kind == 'teams' else PlayerMatchStats
+    key = box.team_id if kind == 'teams' else box.player_id
+    query = Session.query(key, box.team_id, Match.league_id, Match.id, Match.date,
+                Match.home_id, Match.result).join(box.match)
+    if league_id is not None:
+        query = query.filter(Match.league_id == league_id)
+    rows = query.all()
+    cols = list(zip(*rows)) or [[]] * 7
+    entity = np.array(cols[0], dtype=np.int64)
+    team_id = np.array(cols[1], dtype=np.int64)
+    league = np.array(cols[2], dtype=np.int64)
+    date = np.array(cols[4], dtype='datetime64[D]')
+    outcomes = parse_results(cols[6]) * np.where(team_id == np.array(cols[5]), 1, -1)
+
+    order = np.lexsort((date, league, entity))
+    groups = entity * (1 << 32) + league
+    return {
+        'entity': entity[order], 'team_id': team_id[order], 'league_id': league[order],
+        'match_id': np.array(cols[3], dtype=np.int64)[order], 'date': date[order],
+        'STREAK': streaks(groups[order], outcomes[order]),
+    }
@@ -0,0 +1,148 @@
+import datetime
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.pool import StaticPool
+
+from . import Session, Base, metrics
+from .overview import Country, City, CityDistance, CityTeam, League, Team, Match
+from .personnel import Player
+from .stats import TeamMatchStats, PlayerMatchStats
+
+
+def use_sqlite(url='sqlite://'):
+    """
+    binds Session to a fresh SQLite database, in memory by default, with every
+    table created
+    """
+    engine = create_engine(url, poolclass=StaticPool,
+                           connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    Session.remove()
+    Session.configure(bind=engine)
+    return engine
+
+
+def _next_id(model):
+    return (Session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def round_robin(teams):
+    """
+    rounds of (home, away) pairs where every team meets every other twice, once
+    at home, by the circle method
+    """
+    teams = list(teams) + ([None] if len(teams) % 2 else [])
+    n = len(teams)
+    rounds = []
+    for r in range(n - 1):
+        pairs = [(teams[k], teams[n - 1 - k]) for k in range(n // 2)]
+        rounds.append([(a, b) if r % 2 else (b, a) for a, b in pairs if a and b])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(b, a) for a, b in games] for games in rounds]
+
+
+def _box_scores(rng, players):
+    """
+    counting stats of the players of a team in one match, and of the team as
+    their sum
+    """
+    share = rng.dirichlet(np.ones(players) * 2)
+    MP = np.round(share * 240, 1)
+    FGA = rng.binomial(np.maximum(np.round(MP * 0.6).astype(int), 1), 0.7)
+    THRA = rng.binomial(FGA, 0.35)
+    TWOA = FGA - THRA
+    TWO = rng.binomial(TWOA, 0.52)
+    THR = rng.binomial(THRA, 0.36)
+    FTA = rng.binomial(np.maximum(np.round(MP * 0.15).astype(int), 1), 0.8)
+    FT = rng.binomial(FTA, 0.77)
+    box = {
+        'MP': MP, 'FGA': FGA, 'FG': TWO + THR, 'TWOA': TWOA, 'TWO': TWO, 'THRA': THRA,
+        'THR': THR, 'FTA': FTA, 'FT': FT, 'PTS': 2 * TWO + 3 * THR + FT,
+        'ORB': rng.poisson(MP * 0.04), 'DRB': rng.poisson(MP * 0.13),
+        'AST': rng.poisson(MP * 0.09), 'STL': rng.poisson(MP * 0.03),
+        'BLK': rng.poisson(MP * 0.02), 'TOV': rng.poisson(MP * 0.06),
+        'PF': rng.poisson(MP * 0.08), 'PLUS_MINUS': np.zeros(players, dtype=int),
+    }
+    box['TRB'] = box['ORB'] + box['DRB']
+    return box, dict((c, v.sum()) for c, v in box.items())
+
+
+def generate(leagues=1, teams=8, players=12, seasons=1, cycles=1, playoff_rounds=2,
+                start=datetime.date(2015, 10, 27), seed=0, derived=True):
+    """
+    writes leagues of teams with players, playing cycles double round robins per
+    season followed by playoff rounds, with player and team box scores. returns
+    the ids written
+    """
+    rng = np.random.RandomState(seed)
+    ids = dict((model, _next_id(model)) for model in (Country, City, CityDistance, CityTeam,
+                League, Team, Player, Match, TeamMatchStats, PlayerMatchStats))
+    rows = dict((model, []) for model in ids)
+
+    def add(model, **row):
+        row['id'] = ids[model]
+        ids[model] += 1
+        rows[model].append(row)
+        return row['id']
+
+    created = {'leagues': [], 'teams': [], 'players': [], 'matches': []}
+    for l in range(leagues):
+        country = add(Country, name='Country %d' % ids[Country])
+        league_teams, rosters, homes = [], {}, {}
+        for t in range(teams):
+            city = add(City, name='City %d' % ids[City], country_id=country)
+            team = add(Team, name='Team %d' % ids[Team], country_id=country)
+            add(CityTeam, city_id=city, team_id=team)
+            league_teams.append(team)
+            homes[team] = city
+            rosters[team] = [add(Player, name='Player %d' % ids[Player], country_id=country)
+                             for _ in range(players)]
+        cities = list(homes.values())
+        xy = rng.uniform(0, 4000, (len(cities), 2))
+        for a in range(len(cities)):
+            for b in range(len(cities)):
+                if a != b:
+                    add(CityDistance, city1_id=cities[a], city2_id=cities[b],
+                        distance=round(float(np.hypot(*(xy[a] - xy[b]))), 1))
+
+        for s in range(seasons):
+            year = start.year + s
+            league = add(League, name='League %d' % l, season='%d-%d' % (year, year + 1),
+                         country_id=country)
+            created['leagues'].append(league)
+            schedule = [('Season', games) for _ in range(cycles)
+                        for games in round_robin(league_teams)]
+            schedule += [('Post-Season', games)
+                         for games in round_robin(league_teams)[:playoff_rounds]]
+            day = start.replace(year=year)
+            for type_, games in schedule:
+                for home, away in games:
+                    scores = {}
+                    match = ids[Match]
+                    for team in (home, away):
+                        box, total = _box_scores(rng, players)
+                        scores[team] = int(total['PTS'])
+                        add(TeamMatchStats, match_id=match, team_id=team,
+                            **dict((c, float(v) if c == 'MP' else int(v))
+                                   for c, v in total.items()))
+                        for n, player in enumerate(rosters[team]):
+                            add(PlayerMatchStats, match_id=match, team_id=team,
+                                player_id=player, **dict((c, float(v[n]) if c == 'MP'
+                                                          else int(v[n]))
+                                                         for c, v in box.items()))
+                    add(Match, date=day, league_id=league, type=type_, home_id=home,
+                        away_id=away, city_id=homes[home],
+                        result='%d-%d' % (scores[home], scores[away]))
+                    created['matches'].append(match)
+                day += datetime.timedelta(days=int(rng.choice([1, 2, 2, 3])))
+        created['teams'] += league_teams
+        created['players'] += [p for team in league_teams for p in rosters[team]]
+
+    for model in (Country, City, Team, CityTeam, CityDistance, League, Player, Match,
+                  TeamMatchStats, PlayerMatchStats):
+        Session.bulk_insert_mappings(model, rows[model])
+    if derived:
+        for n in range(0, len(created['matches']), 500):
+            metrics.update_box_scores(created['matches'][n:n + 500])
+    Session.commit()
+    return created
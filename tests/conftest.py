@@ -0,0 +1,24 @@
+import pytest
+
+from .. import Session, synthetic, snapshots, store, index, cache
+
+
+@pytest.fixture
+def engine():
+    engine = synthetic.use_sqlite()
+    yield engine
+    cache.use_cache(None)
+    store.use_store(None)
+    index.use_index(None)
+    Session.remove()
+    engine.dispose()
+
+
+@pytest.fixture
+def league(engine):
+    """
+    one synthetic season with playoffs and its snapshots rebuilt
+    """
+    created = synthetic.generate(leagues=1, teams=6, players=6, seasons=1, playoff_rounds=2)
+    snapshots.rebuild_all(processes=1, progress=False)
+    return created
@@ -0,0 +1,69 @@
+import asyncio
+from sqlalchemy import literal, select
+
+from .. import Session, aio, cache, index, store, synthetic, snapshots
+from ..overview import Match
+from ..personnel import Player
+from ..stats import PlayerMatchStats
+
+
+def test_async_lookups_match_sync_ones(tmp_path):
+    # the async engine opens its own connections, so the database must be a file
+    url = 'sqlite:///%s' % (tmp_path / 'aio.db')
+    engine = synthetic.use_sqlite(url)
+    try:
+        synthetic.generate(leagues=1, teams=4, players=5, seasons=1, playoff_rounds=1)
+        snapshots.rebuild_all(processes=1, progress=False)
+        Session.commit()
+        match = Session.query(Match).order_by(Match.date.desc()).first()
+        season = match.league.season
+        player = Session.get(Player, Session.query(PlayerMatchStats.player_id).filter(
+                PlayerMatchStats.match_id == match.id).first()[0])
+        # the last regular season match when no date, none in a season not played
+        dates = [match.date, None, None]
+        seasons = [season, season, 'none']
+        expected = [player.season_stats(s, d, loc=loc) for s, d in zip(seasons, dates)
+                    for loc in ('all', 'home', 'away')]
+
+        async def lookups():
+            try:
+                stats = await aio.gather(*[aio.season_stats('players', player.id, s, d,
+                                                            loc=loc)
+                                           for s, d in zip(seasons, dates)
+                                           for loc in ('all', 'home', 'away')])
+                teams = await aio.matchup(match.home_id, match.away_id, season, match.date,
+                                          players=[player.id], match_id=match.id)
+                return stats, teams
+            finally:
+                await aio.dispose()
+
+        aio.configure(url)
+        stats, teams = asyncio.run(lookups())
+        assert stats == expected and expected[-1] == [None] * len(expected[-1])
+        assert teams['players'][player.id] == dict(zip(snapshots.metric_names('critical'),
+                                                       expected[0]))
+        assert teams['home']['prev_match'].date < match.date
+        assert teams['odds'] == []
+    finally:
+        aio.configure()
+        cache.use_cache(None)
+        store.use_store(None)
+        index.use_index(None)
+        Session.remove()
+        engine.dispose()
+
+
+def test_configure_disposes_of_the_current_engine(tmp_path):
+    url = 'sqlite:///%s' % (tmp_path / 'aio.db')
+    aio.configure(url)
+    try:
+        async def lookup():
+            return await aio._execute(select(literal(1)))
+
+        assert asyncio.run(lookup()) == [(1,)]
+        engine = aio.get_engine()
+        assert engine.sync_engine.pool.checkedin() == 1
+        aio.configure(url)
+        assert engine.sync_engine.pool.checkedin() == 0
+    finally:
+        aio.configure()
@@ -0,0 +1,29 @@
+from .. import Session, cache, store
+from ..overview import Match
+from ..personnel import Player
+from ..snapshots import SnapshotBuilder
+
+
+def _player(match):
+    return Session.get(Player, match.players_stats[0].player_id)
+
+
+def test_builder_drops_the_cached_lookups_it_rewrites(league):
+    active = cache.enable()
+    match = Session.query(Match).order_by(Match.date.desc()).first()
+    player, season = _player(match), match.league.season
+    player.season_stats(season, match.date)
+    assert len(active) == 1
+    SnapshotBuilder().add(match)
+    assert len(active) == 0 and active.invalidations == 1
+
+
+def test_switching_to_the_store_drops_cached_lookups(league):
+    active = cache.enable()
+    match = Session.query(Match).first()
+    _player(match).season_stats(match.league.season, match.date)
+    store.load()
+    assert len(active) == 0
+    _player(match).season_stats(match.league.season, match.date)
+    store.use_store(None)
+    assert len(active) == 0
@@ -0,0 +1,18 @@
+import numpy as np
+
+from .. import Session, store
+from ..overview import Match
+from ..personnel import Player
+
+
+def test_bulk_form_without_store_matches_store(league):
+    match = Session.query(Match).order_by(Match.date).all()[-5]
+    season = match.league.season
+    ids, form = Player.bulk_form(season, match.date, n=3, metrics='raw')
+    store.load()
+    expected_ids, expected = Player.bulk_form(season, match.date, n=3, metrics='raw')
+    assert (ids == expected_ids).all()
+    assert np.allclose(form, expected, equal_nan=True)
+    player = Session.get(Player, int(ids[0]))
+    assert np.allclose(player.form(season, match.date, n=3, metrics='raw'), form[0],
+                       equal_nan=True)
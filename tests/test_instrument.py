@@ -0,0 +1,36 @@
+from sqlalchemy import event
+
+from .. import Session, instrument
+from ..overview import Match
+
+
+def test_track_times_selects_and_passes_dml_through(league):
+    instrument.install()
+    try:
+        with instrument.track('dml') as tracker:
+            assert Session.query(Match).filter(Match.id < 0).delete() == 0
+            assert Session.query(Match).filter(Match.id == 1).update({'attendance': 5}) == 1
+            matches = Session.query(Match).all()
+    finally:
+        instrument.uninstall()
+    assert [q.rows for q in tracker.queries] == [None, None, len(matches)]
+
+
+def test_track_stops_listening_when_the_outermost_block_exits(league):
+    engine = Session.get_bind()
+    with instrument.track('outer') as outer:
+        with instrument.track('inner'):
+            Session.query(Match).count()
+        assert event.contains(engine, 'before_cursor_execute', instrument._before)
+        Session.query(Match).count()
+    assert len(outer) == 2
+    assert not event.contains(engine, 'before_cursor_execute', instrument._before)
+    assert not event.contains(Session, 'do_orm_execute', instrument._orm_execute)
+
+    instrument.install()
+    try:
+        with instrument.track('installed'):
+            pass
+        assert event.contains(engine, 'before_cursor_execute', instrument._before)
+    finally:
+        instrument.uninstall()
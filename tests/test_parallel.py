@@ -0,0 +1,29 @@
+from sqlalchemy.pool import NullPool, StaticPool
+
+from .. import Session, configure, parallel, synthetic
+from ..overview import Country
+
+
+def _pool(item):
+    bind = Session.get_bind()
+    Session.query(Country).count()
+    return type(bind.pool).__name__
+
+
+def test_workers_keep_the_engine_options(tmp_path):
+    url = 'sqlite:///%s' % (tmp_path / 'parallel.db')
+    engine = synthetic.use_sqlite(url)
+    try:
+        results = [r[1] for r in parallel.imap(_pool, range(2), processes=2)]
+        assert results == [StaticPool.__name__] * 2
+
+        # Session on the package engine, set up through configure
+        Session.remove()
+        Session.configure(bind=None)
+        configure(url, poolclass=NullPool)
+        results = [r[1] for r in parallel.imap(_pool, range(2), processes=2)]
+        assert results == [NullPool.__name__] * 2
+    finally:
+        configure()
+        Session.remove()
+        engine.dispose()
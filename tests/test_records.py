@@ -0,0 +1,16 @@
+import numpy as np
+
+from .. import Session, instrument, records
+from ..stats import PlayerMatchStats
+
+
+def test_from_orm_loads_match_dates_in_one_query(league):
+    instances = Session.query(PlayerMatchStats).order_by(PlayerMatchStats.id).limit(200).all()
+    expected = records.load('players', where=PlayerMatchStats.id.in_([i.id for i in instances]))
+    with instrument.track('from_orm') as tracker:
+        converted = records.Records.from_orm(instances)
+    assert len(tracker.queries) == 1
+    for name in expected.array.dtype.names:
+        a, b = converted.array[name], expected.array[name]
+        assert np.allclose(a, b, rtol=1e-6, equal_nan=True) if a.dtype.kind == 'f' \
+            else (a == b).all(), name
@@ -0,0 +1,64 @@
+from .. import Session
+from ..overview import Match
+from ..snapshots import TABLES, LOCS, SnapshotBuilder
+
+
+def _dump(table):
+    columns = [c.name for c in table.__table__.columns if c.name != 'id']
+    rows = Session.query(*[getattr(table, c) for c in columns]).all()
+    return columns, sorted(tuple(r) for r in rows)
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, (int, float)) or hasattr(a, 'as_tuple'):
+        return abs(float(a) - float(b)) <= 1e-6 * max(1., abs(float(b)))
+    return a == b
+
+
+def test_builder_matches_rebuild(league):
+    expected = dict((table, _dump(table)) for locs in TABLES.values()
+                    for table in locs.values())
+    for locs in TABLES.values():
+        for table in locs.values():
+            Session.query(table).delete()
+    Session.commit()
+
+    for loc in LOCS:
+        builder = SnapshotBuilder(loc)
+        for match in Session.query(Match).order_by(Match.date, Match.id):
+            builder.add(match)
+        Session.commit()
+
+    for table, (columns, rows) in expected.items():
+        built = _dump(table)[1]
+        assert len(built) == len(rows) > 0, table.__tablename__
+        for a, b in zip(built, rows):
+            for name, x, y in zip(columns, a, b):
+                assert _same(x, y), (table.__tablename__, name, a[:4], x, y)
+
+
+def test_builder_started_mid_season_matches_rebuild(league):
+    expected = dict((table, _dump(table)) for locs in TABLES.values()
+                    for table in locs.values())
+    dates = sorted(set(r[0] for r in Session.query(Match.date)))
+    start = dates[len(dates) // 2]
+    for locs in TABLES.values():
+        for table in locs.values():
+            Session.query(table).filter(table.date >= start).delete()
+    Session.commit()
+
+    for loc in LOCS:
+        builder = SnapshotBuilder(loc)
+        for match in Session.query(Match).filter(Match.date >= start).order_by(Match.date,
+                                                                                Match.id):
+            builder.add(match)
+        Session.commit()
+
+    for table, (columns, rows) in expected.items():
+        built = _dump(table)[1]
+        assert len(built) == len(rows), table.__tablename__
+        for a, b in zip(built, rows):
+            for name, x, y in zip(columns, a, b):
+                assert _same(x, y), (table.__tablename__, name, a[:4], x, y)
@@ -0,0 +1,89 @@
+import datetime
+
+from .. import Session, ingest, store, snapshots
+from ..overview import Match
+from ..personnel import Player
+from ..stats import COUNTING_STATS
+
+
+METRICS = ['EFGP', 'TOVP', 'ORBP', 'DRBP', 'FT_to_FGA', 'TSP', 'USGP', 'ORtg', 'HOB'] + \
+          COUNTING_STATS
+
+
+def _same(a, b):
+    return len(a) == len(b) and all(x is None and y is None or
+                                    x is not None and y is not None and
+                                    abs(x - y) <= 1e-6 * max(1., abs(y))
+                                    for x, y in zip(a, b))
+
+
+def _lookups(created):
+    dates = sorted(set(r[0] for r in Session.query(Match.date)))
+    # match days, a day without matches and the last regular season match
+    dates = [None, dates[3], dates[3] + datetime.timedelta(days=1), dates[-1]]
+    players = [Session.get(Player, i) for i in created['players'][::7]]
+    season = Session.query(Match).first().league.season
+    return [(p, season, d, loc) for p in players for d in dates
+            for loc in ('all', 'home', 'away')]
+
+
+def test_season_stats_store_matches_database(league):
+    cases = _lookups(league)
+    expected = [p.season_stats(s, d, metrics=METRICS, loc=loc) for p, s, d, loc in cases]
+    store.load()
+    for (p, s, d, loc), rv in zip(cases, expected):
+        assert _same(p.season_stats(s, d, metrics=METRICS, loc=loc), rv), (p.id, d, loc)
+
+
+def test_season_stats_store_falls_back_for_snapshot_only_metrics(league):
+    p, s, d, loc = _lookups(league)[0]
+    expected = p.season_stats(s, d, metrics=['STREAK', 'DIST_7', 'PTS'])
+    store.load()
+    assert _same(p.season_stats(s, d, metrics=['STREAK', 'DIST_7', 'PTS']), expected)
+
+
+def _replay(match, days):
+    """
+    ingest payload of match played again days later
+    """
+    boxes = dict((b.team_id, b) for b in match.teams_stats)
+    sides = {match.home_id: 'home', match.away_id: 'away'}
+
+    def stats(box):
+        return dict((c, getattr(box, c)) for c in COUNTING_STATS)
+
+    return {'league': match.league.name, 'season': match.league.season,
+            'date': match.date + datetime.timedelta(days=days), 'type': match.type,
+            'home': match.home.name, 'away': match.away.name, 'result': match.result,
+            'teams': dict((sides[t], stats(b)) for t, b in boxes.items()),
+            'players': [dict(stats(b), name=b.player.name, team=sides[b.team_id])
+                        for b in match.players_stats]}
+
+
+def test_refresh_merges_like_a_full_load(league):
+    active = store.load()
+    matches = Session.query(Match).order_by(Match.date, Match.id).all()
+    last = matches[-1].date
+    ingest.ingest([_replay(m, (last - m.date).days + n + 1)
+                   for n, m in enumerate(matches[:3])])
+    snapshots.rebuild_all(processes=1, progress=False)
+    assert active.refresh() > 0
+    full = store.StatsStore()
+    full.refresh()
+    for kind in ('players', 'teams'):
+        merged, loaded = getattr(active, kind), getattr(full, kind)
+        for name in merged.fields + ('values', 'keys'):
+            a, b = getattr(merged, name), getattr(loaded, name)
+            assert a.shape == b.shape and ((a == b) | ((a != a) & (b != b))).all(), \
+                (kind, name)
+        assert merged.slices == loaded.slices
+        entries = getattr(active.index, kind).entries
+        assert len(entries) == len(getattr(full.index, kind).entries)
+        for key, (dates, ids) in getattr(full.index, kind).entries.items():
+            assert (entries[key][0] == dates).all() and (entries[key][1] == ids).all()
+
+    cases = _lookups(league)
+    expected = [p.season_stats(s, None, metrics=METRICS, loc=loc) for p, s, d, loc in cases]
+    store.use_store(None)
+    for (p, s, d, loc), rv in zip(cases, expected):
+        assert _same(p.season_stats(s, None, metrics=METRICS, loc=loc), rv)
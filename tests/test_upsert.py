@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import func, select, text
+
+from .. import Session
+from ..overview import Match, MatchSquawkaCode
+from ..stats import PlayerMatchStats, TeamMatchStats
+from ..upsert import ensure_unique, upsert
+
+
+def _copy(table, where, **values):
+    """
+    inserts copies of the rows of table matching where, with values in place of
+    their columns, returning their ids
+    """
+    top = Session.execute(select(func.max(table.c.id))).scalar()
+    names = [c.name for c in table.columns if c.name != 'id']
+    Session.execute(text('INSERT INTO %s (id, %s) SELECT id + %d, %s FROM %s WHERE %s' % (
+        table.name, ', '.join('"%s"' % n for n in names), top,
+        ', '.join(str(values[n]) if n in values else '"%s"' % n for n in names),
+        table.name, where)))
+    return [r[0] for r in Session.execute(select(table.c.id).where(table.c.id > top))]
+
+
+def _drop_key(table):
+    """
+    recreates table without its unique constraint, as created before it was declared
+    """
+    Session.execute(text('PRAGMA legacy_alter_table = ON'))
+    Session.execute(text('ALTER TABLE %s RENAME TO old' % table.name))
+    Session.execute(text('CREATE TABLE %s AS SELECT * FROM old' % table.name))
+    Session.execute(text('DROP TABLE old'))
+
+
+def test_upsert_needs_the_unique_index_ensure_unique_creates(engine):
+    table = MatchSquawkaCode.__table__
+    _drop_key(table)
+    Session.execute(table.insert(), [{'id': 1, 'match_id': 1, 'code': 'a'},
+                                     {'id': 2, 'match_id': 1, 'code': 'a'},
+                                     {'id': 3, 'match_id': 2, 'code': 'b'}])
+    with pytest.raises(ValueError):
+        upsert(MatchSquawkaCode, [{'match_id': 1, 'code': 'a'}])
+    with pytest.raises(ValueError):
+        ensure_unique([MatchSquawkaCode])
+    assert Session.query(MatchSquawkaCode).count() == 3
+
+    assert ensure_unique([MatchSquawkaCode], dedupe=True) == \
+        ['uq_%s_match_id_code' % table.name]
+    assert ensure_unique([MatchSquawkaCode]) == []
+    assert [r[0] for r in Session.execute(table.select().order_by(table.c.id))] == [1, 3]
+    upsert(MatchSquawkaCode, [{'id': 4, 'match_id': 1, 'code': 'a'},
+                              {'id': 5, 'match_id': 3, 'code': 'c'}])
+    assert Session.query(MatchSquawkaCode).count() == 3
+
+
+def test_dedupe_repoints_the_rows_referencing_a_duplicate(league):
+    match = Session.query(Match).first()
+    match_id, home_id = match.id, match.home_id
+    players = PlayerMatchStats.__table__
+    counts = [Session.query(model).filter(model.match_id == match_id).count()
+              for model in (PlayerMatchStats, TeamMatchStats)]
+    total = Session.query(PlayerMatchStats).count()
+    Session.expunge_all()
+    _drop_key(Match.__table__)
+    duplicate = _copy(Match.__table__, 'id = %d' % match_id)[0]
+    # the home box scores move to the duplicate, one player's is stored under both and
+    # the copy under the first match is kept
+    for model in (PlayerMatchStats, TeamMatchStats):
+        Session.query(model).filter(model.match_id == match_id).filter(
+            model.team_id == home_id).update({'match_id': duplicate})
+    copied = _copy(players, 'match_id = %d AND team_id = %d LIMIT 1' % (duplicate, home_id),
+                   match_id=match_id)
+
+    with pytest.raises(ValueError):
+        ensure_unique([Match])
+    assert ensure_unique([Match], dedupe=True)
+    assert Session.get(Match, duplicate) is None
+    assert [Session.query(model).filter(model.match_id == match_id).count()
+            for model in (PlayerMatchStats, TeamMatchStats)] == counts
+    assert Session.get(PlayerMatchStats, copied[0]) is not None
+    assert Session.query(PlayerMatchStats).count() == total
+    assert Session.query(PlayerMatchStats).filter(
+        PlayerMatchStats.match_id.notin_(select(Match.id))).count() == 0
@@ -0,0 +1,114 @@
+import numpy as np
+from sqlalchemy import func, or_
+
+from . import Session
+from .overview import CityDistance, Match, Stadium
+
+
+class Distances(object):
+    """
+    dense city by city distance matrix
+    """
+
+    def __init__(self, rows):
+        cities = sorted(set([r[0] for r in rows] + [r[1] for r in rows]))
+        self.codes = dict((c, n) for n, c in enumerate(cities))
+        self.matrix = np.full((len(cities) + 1, len(cities) + 1), np.nan)
+        np.fill_diagonal(self.matrix, 0.)
+        for a, b, distance in rows:
+            a, b = self.codes[a], self.codes[b]
+            self.matrix[a, b] = self.matrix[b, a] = float(distance)
+
+    @classmethod
+    def load(cls):
+        return cls(Session.query(CityDistance.city1_id, CityDistance.city2_id,
+                                 CityDistance.distance).all())
+
+    def between(self, a, b):
+        """
+        distances between two arrays of city ids, 0 where either city or the pair
+        is unknown
+        """
+        unknown = len(self.codes)
+        a = np.array([self.codes.get(c, unknown) for c in a], dtype=int)
+        b = np.array([self.codes.get(c, unknown) for c in b], dtype=int)
+        distances = self.matrix[a, b]
+        return np.where(np.isnan(distances), 0., distances)
+
+
+def trailing(entity, day, values, days=7):
+    """
+    sum of values over the days long window ending on each row's day, for rows
+    sorted by (entity, day)
+    """
+    keys = np.asarray(entity, dtype=np.int64) * (1 << 32) + np.asarray(day, dtype=np.int64)
+    prefix = np.r_[0., np.cumsum(values)]
+    lo = np.searchsorted(keys, keys - (days - 1), side='left')
+    hi = np.searchsorted(keys, keys, side='right')
+    return prefix[hi] - prefix[lo]
+
+
+def schedule(league_id, team_ids=None, before=None, since=None):
+    """
+    (team, match id, day, city) of every match of league (from since, before
+    before), two rows per match sorted by team and day. a match's city falls back
+    to its stadium's
+    """
+    query = Session.query(Match.id, Match.date, Match.home_id, Match.away_id,
+                func.coalesce(Match.city_id, Stadium.city_id)
+            ).outerjoin(Match.stadium).filter(Match.league_id == league_id)
+    if team_ids is not None:
+        query = query.filter(or_(Match.home_id.in_(team_ids), Match.away_id.in_(team_ids)))
+    if before is not None:
+        query = query.filter(Match.date < before)
+    if since is not None:
+        query = query.filter(Match.date >= since)
+    rows = query.all()
+    team = np.array([r[2] for r in rows] + [r[3] for r in rows], dtype=np.int64)
+    match_id = np.array([r[0] for r in rows] * 2, dtype=np.int64)
+    day = np.array([r[1] for r in rows] * 2, dtype='datetime64[D]').astype(np.int64)
+    city = np.array([r[4] for r in rows] * 2, dtype=object)
+    if team_ids is not None:
+        keep = np.isin(team, list(team_ids))
+        team, match_id, day, city = team[keep], match_id[keep], day[keep], city[keep]
+    order = np.lexsort((day, team))
+    return team[order], match_id[order], day[order], city[order]
+
+
+def last_city(league_id, team_id, before):
+    """
+    (True, city) of the last match of the team in league before before, (False,
+    None) if there is none
+    """
+    row = Session.query(func.coalesce(Match.city_id, Stadium.city_id)).outerjoin(
+            Match.stadium).filter(Match.league_id == league_id).filter(
+            or_(Match.home_id == team_id, Match.away_id == team_id)).filter(
+            Match.date < before).order_by(Match.date.desc(), Match.id.desc()).first()
+    return (True, row[0]) if row else (False, None)
+
+
+class Travel(object):
+    """
+    distance travelled and matches played by every team over the 7 days up to and
+    including each of its matches
+    """
+
+    def __init__(self, team, match_id, day, city, distances):
+        self.team, self.match_id, self.day = team, match_id, day
+        legs = np.zeros(len(team))
+        if len(team):
+            legs[1:] = np.where(team[1:] == team[:-1],
+                                distances.between(city[:-1], city[1:]), 0.)
+        self.DIST_7 = trailing(team, day, legs)
+        self.MATCHES_PLAYED_7 = trailing(team, day, np.ones(len(team)))
+
+    @classmethod
+    def load(cls, league_id, distances=None):
+        return cls(*schedule(league_id), distances=distances or Distances.load())
+
+    def table(self):
+        """
+        (team, match id) -> (DIST_7, MATCHES_PLAYED_7)
+        """
+        return dict(zip(zip(self.team.tolist(), self.match_id.tolist()),
+                        zip(self.DIST_7.tolist(), self.MATCHES_PLAYED_7.tolist())))
@@ -0,0 +1,228 @@
+from sqlalchemy import Index, UniqueConstraint, and_, bindparam, func, inspect, select, tuple_
+
+from . import Base, Session
+
+
+# bound parameters per statement, under the limits of sqlite and postgres
+MAX_PARAMS = 30000
+
+# (url, table, key) found backed by a unique index in the database
+_checked = set()
+
+
+def natural_key(model):
+    """
+    columns of the unique constraint declared in the model's (or table's)
+    __table_args__, or of its single column unique index
+    """
+    table = getattr(model, '__table__', model)
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            return [c.name for c in constraint.columns]
+    for column in table.columns:
+        if column.unique:
+            return [column.name]
+    raise ValueError('%s declares no natural key' % getattr(model, '__name__', table.name))
+
+
+def has_unique(connection, table, key):
+    """
+    whether the database holds a unique constraint or index over exactly the key
+    columns of table, which ON CONFLICT needs. create_all only adds the ones of
+    __table_args__ to tables it creates
+    """
+    inspector = inspect(connection)
+    key = set(key)
+    if set(inspector.get_pk_constraint(table.name)['constrained_columns']) == key:
+        return True
+    return any(set(c['column_names']) == key
+               for c in inspector.get_unique_constraints(table.name)) or \
+        any(i['unique'] and set(i['column_names']) == key
+            for i in inspector.get_indexes(table.name))
+
+
+def duplicates(connection, table, key):
+    """
+    (key, first id, rows) of every natural key of table stored more than once
+    """
+    columns = [table.c[k] for k in key]
+    statement = select(*columns, func.min(table.c.id), func.count()).where(
+            and_(*[c.isnot(None) for c in columns])).group_by(*columns).having(func.count() > 1)
+    return [(tuple(r[:len(key)]), r[-2], r[-1]) for r in connection.execute(statement)]
+
+
+def _children(connection, table):
+    """
+    (table, column) of the foreign keys to the id of table in the database
+    """
+    inspector = inspect(connection)
+    return [(child, fk.parent) for child in Base.metadata.sorted_tables
+            for fk in child.foreign_keys
+            if fk.column is table.c.id and inspector.has_table(child.name)]
+
+
+def _merge(connection, table, moved):
+    """
+    deletes the rows of table whose id is a key of moved, once the rows
+    referencing them are repointed to the id moved maps them to. a repointed row
+    that would duplicate the natural key of another one is merged into it the
+    same way
+    """
+    if not moved:
+        return
+    old = list(moved)
+    for child, column in _children(connection, table):
+        try:
+            key = natural_key(child)
+        except ValueError:
+            key = []
+        merged = {}
+        if column.name in key:
+            columns = [child.c[k] for k in key]
+            at = key.index(column.name)
+            kept = dict((tuple(r[1:]), r[0]) for r in connection.execute(
+                    select(child.c.id, *columns).where(column.in_(set(moved.values())))))
+            for r in connection.execute(select(child.c.id, *columns).where(column.in_(old))
+                                        .order_by(child.c.id)):
+                target = list(r[1:])
+                target[at] = moved[target[at]]
+                target = tuple(target)
+                if None in target:
+                    continue
+                if target in kept:
+                    merged[r[0]] = kept[target]
+                else:
+                    kept[target] = r[0]
+        _merge(connection, child, merged)
+        connection.execute(child.update().where(column == bindparam('_old')).values(
+                {column.name: bindparam('_new')}),
+                [{'_old': o, '_new': n} for o, n in moved.items()])
+    for n in range(0, len(old), MAX_PARAMS):
+        connection.execute(table.delete().where(table.c.id.in_(old[n:n + MAX_PARAMS])))
+
+
+def ensure_unique(models=None, connection=None, dedupe=False):
+    """
+    creates the unique indexes of the natural keys of models (every mapped model
+    declaring one by default) missing from the database, and returns their names.
+    nothing is created while a key is stored more than once: ValueError lists the
+    duplicates, unless dedupe is set, which merges every duplicate into the row
+    with the lowest id, repointing the rows referencing it first
+    """
+    connection = connection or Session.connection()
+    inspector = inspect(connection)
+    tables = set(m.__table__ for m in models) if models is not None else None
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if tables is not None and table not in tables:
+            continue
+        try:
+            key = natural_key(table)
+        except ValueError:
+            continue
+        if inspector.has_table(table.name) and not has_unique(connection, table, key):
+            missing.append((table, key))
+    if not dedupe:
+        found = [(table, key, duplicates(connection, table, key)) for table, key in missing]
+        found = [f for f in found if f[2]]
+        if found:
+            raise ValueError('natural keys stored more than once, merge them with '
+                             'ensure_unique(dedupe=True): ' + '; '.join(
+                                 '%s (%s): %d keys, first %s' % (table.name, ', '.join(key),
+                                 len(rows), [r[0] for r in rows[:5]])
+                                 for table, key, rows in found))
+    created = []
+    for table, key in missing:
+        if dedupe:
+            rows = duplicates(connection, table, key)
+            if rows:
+                columns = [table.c[k] for k in key]
+                first = dict((r[0], r[1]) for r in rows)
+                moved = {}
+                for r in connection.execute(select(table.c.id, *columns).where(
+                        tuple_(*columns).in_(list(first)) if len(key) > 1
+                        else columns[0].in_([k[0] for k in first]))):
+                    if r[0] != first[tuple(r[1:])]:
+                        moved[r[0]] = first[tuple(r[1:])]
+                _merge(connection, table, moved)
+        index = Index('uq_%s_%s' % (table.name, '_'.join(key)), *[table.c[k] for k in key],
+                      unique=True)
+        index.create(connection)
+        created.append(index.name)
+    _checked.clear()
+    return created
+
+
+def _dialect_insert(name):
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def _fallback(connection, table, rows, key, update):
+    """
+    upsert for databases without ON CONFLICT: one select of the existing keys,
+    then an executemany update and an executemany insert
+    """
+    columns = [table.c[k] for k in key]
+    found = {}
+    for n in range(0, len(rows), MAX_PARAMS // len(key)):
+        chunk = rows[n:n + MAX_PARAMS // len(key)]
+        condition = tuple_(*columns).in_([tuple(r[k] for k in key) for r in chunk]) \
+            if len(key) > 1 else columns[0].in_([r[key[0]] for r in chunk])
+        found.update((tuple(r[1:]), r[0]) for r in connection.execute(
+                     select(table.c.id, *columns).where(condition)))
+    old = [r for r in rows if tuple(r[k] for k in key) in found]
+    new = [r for r in rows if tuple(r[k] for k in key) not in found]
+    if old and update:
+        statement = table.update().where(and_(*[table.c[k] == bindparam('_' + k)
+                                                for k in key])
+                    ).values(dict((c, bindparam('_' + c)) for c in update))
+        connection.execute(statement, [dict(('_' + c, r[c]) for c in set(key) | set(update))
+                                       for r in old])
+    if new:
+        connection.execute(table.insert(), new)
+
+
+def upsert(model, rows, key=None, update=None):
+    """
+    inserts rows, dicts with the same keys, updating the ones whose natural key
+    is already stored. key defaults to the model's unique constraint, update to
+    every other column of the rows. one multi row INSERT .. ON CONFLICT per
+    chunk on postgres and sqlite, which raises ValueError when the database
+    lacks the unique index of key. returns the rows written
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    table = model.__table__
+    key = list(key or natural_key(model))
+    if update is None:
+        update = [c for c in rows[0] if c not in key and c != 'id']
+    connection = Session.connection()
+    insert = _dialect_insert(connection.dialect.name)
+    if insert is None:
+        _fallback(connection, table, rows, key, update)
+        return len(rows)
+
+    checked = (str(connection.engine.url), table.name, tuple(key))
+    if checked not in _checked:
+        if not has_unique(connection, table, key):
+            raise ValueError('%s has no unique index on (%s) for ON CONFLICT, create it '
+                             'with ensure_unique' % (table.name, ', '.join(key)))
+        _checked.add(checked)
+    chunk_size = max(1, MAX_PARAMS // len(rows[0]))
+    for n in range(0, len(rows), chunk_size):
+        statement = insert(table).values(rows[n:n + chunk_size])
+        if update:
+            statement = statement.on_conflict_do_update(
+                    index_elements=key,
+                    set_=dict((c, statement.excluded[c]) for c in update))
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=key)
+        connection.execute(statement)
+    return len(rows)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class Workload(object):
+    """
+    minutes and games over trailing windows of days, and back to back flags, for
+    every entity at every one of its match dates, computed in one pass over a match
+    log. windows cover the days before the match, not the match itself
+    """
+
+    def __init__(self, log, windows=(7, 15)):
+        self.log = log
+        self.day = log.date.astype(np.int64)
+        self.keys = log.entity.astype(np.int64) * (1 << 32) + self.day
+        minutes = log.values[:, log.col['MP']]
+        self.minutes = np.r_[0., np.cumsum(np.where(np.isnan(minutes), 0., minutes))]
+        self.windows = {}
+        for days in windows:
+            lo, hi = self._bounds(self.keys, days)
+            self.windows[days] = (self.minutes[hi] - self.minutes[lo], hi - lo)
+
+        same = np.r_[False, log.entity[1:] == log.entity[:-1]]
+        gap = np.r_[0, np.diff(self.day)]
+        self.back_to_back = same & (gap == 1)
+
+    def _bounds(self, keys, days):
+        return np.searchsorted(self.keys, keys - days, side='left'), \
+               np.searchsorted(self.keys, keys, side='left')
+
+    def table(self):
+        """
+        columns of the workload at every match of the log
+        """
+        rv = {'entity': self.log.entity, 'match_id': self.log.match_id,
+              'date': self.log.date, 'B2B': self.back_to_back}
+        for days, (minutes, games) in self.windows.items():
+            rv['MIN_%d' % days] = minutes
+            rv['GAMES_%d' % days] = games
+        return rv
+
+    def at(self, entity_id, date, days=15):
+        """
+        minutes and games of entity in the days before date
+        """
+        key = np.array([entity_id * (1 << 32) + np.datetime64(date, 'D').astype(np.int64)])
+        lo, hi = self._bounds(key, days)
+        return float(self.minutes[hi[0]] - self.minutes[lo[0]]), int(hi[0] - lo[0])